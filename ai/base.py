@@ -1,18 +1,88 @@
-from openai import AsyncOpenAI
+import aiofiles.os
+import traceback
+import aiofiles
+import hashlib
+import openai
+import httpx
+import json
+import math
+import time
 import aiohttp
+import asyncio
 import base64
 import os
 
+from config.logger import ai_logger
+from .images import ImageOptimizer
+from .vision import VisionCache
+from .router import EndpointRouter, AiEndpoint
+from .limiter import (
+    RateLimiter, AiPriority, retry_after, backoff_delay,
+    AI_MAX_CONCURRENCY, AI_REQUESTS_PER_MINUTE, AI_TOKENS_PER_MINUTE, AI_MAX_RETRIES
+)
+
+
+AI_IMAGE_TOKENS = int(os.getenv("AI_IMAGE_TOKENS", 1000))
+AI_COMPLETION_TOKENS = int(os.getenv("AI_COMPLETION_TOKENS", 500))
+AI_CHARS_PER_TOKEN = float(os.getenv("AI_CHARS_PER_TOKEN", 1.5)) # conservative for cyrillic text
+AI_HTTP_POOL_SIZE = int(os.getenv("AI_HTTP_POOL_SIZE", 20))
+AI_IMAGE_FETCH_CONCURRENCY = int(os.getenv("AI_IMAGE_FETCH_CONCURRENCY", 4))
+AI_IMAGE_FETCH_TIMEOUT = float(os.getenv("AI_IMAGE_FETCH_TIMEOUT", 20))
+AI_IMAGE_MAX_BYTES = int(os.getenv("AI_IMAGE_MAX_MB", 10)) * 1024 * 1024
+AI_CAPTIONS_FROM_DESCRIPTIONS = os.getenv("AI_CAPTIONS_FROM_DESCRIPTIONS", "False").lower() == "true"
+AI_DESCRIPTION_MAX_CHARS = int(os.getenv("AI_DESCRIPTION_MAX_CHARS", 800))
+
+BATCH_INSTRUCTION = (
+    "Напиши несколько разных постов по инструкциям выше (количество: {count}), каждый не длиннее 500 символов. "
+    "Ответь только JSON-объектом вида {{\"posts\": [\"текст первого поста\", \"текст второго поста\"]}} без пояснений."
+)
+DESCRIBE_PROMPT = (
+    "Кратко и по существу опиши изображение: кто и что на нем, обстановка, настроение, заметные детали и надписи. "
+    "Не больше пяти предложений, без оценок и вступлений."
+)
+CAPTION_INSTRUCTION = "Описание фотографии, к которой нужно написать пост:\n{description}"
+
+def is_remote(path: str) -> bool:
+    return path.startswith("http://") or path.startswith("https://")
+
+
 class AiManager:
-    _MODEL = os.getenv("MODEL")
-    _CLIENT = AsyncOpenAI(
-            base_url=os.getenv("AI_BASE_URL"),
-            api_key=os.getenv("API_KEY"),
-            max_retries=3
-        )
+    _ROUTER: EndpointRouter = None
+    _LIMITER = RateLimiter(AI_MAX_CONCURRENCY, AI_REQUESTS_PER_MINUTE, AI_TOKENS_PER_MINUTE)
+    _HTTP: aiohttp.ClientSession = None
+    _DESCRIBING: dict[str, asyncio.Task] = {}
+
+    @classmethod
+    async def request_ai(cls, promt: str, post_text: str = None, image_paths: list[str] = None, priority: AiPriority = AiPriority.comment, max_chars: int = None) -> str:
+        """
+            Запрос к ИИ. С max_chars ответ читается потоком и поток закрывается, как только набрано max_chars символов,
+            а max_tokens ограничивается исходя из этого бюджета.
+            Если выбранный эндпоинт принимает ссылки на изображения (image_url_passthrough), удаленные изображения
+            передаются ему ссылками в одной попытке без повторов; при любой ошибке запрос сразу повторяется
+            со скачанными изображениями через общий роутинг.
+        """
+        if image_paths and any(is_remote(path) for path in image_paths):
+            endpoint = cls._router().pick()
+            if endpoint.passthrough_enabled():
+                messages = await cls._build_messages(promt, post_text, image_paths, passthrough=True)
+                try:
+                    # a single attempt: on any error the routed inline request is the retry
+                    return await cls._complete(messages, priority, max_chars=max_chars, endpoint=endpoint, retries=0)
+                except openai.BadRequestError:
+                    endpoint.disable_passthrough()
+                    ai_logger.warning(
+                        f"AI endpoint {endpoint.name} rejected image URLs, inlining images for it for a while!\n" + traceback.format_exc()
+                    )
+                except (openai.APIError, httpx.TransportError):
+                    ai_logger.warning(
+                        f"A error was occured while requesting AI endpoint {endpoint.name} with image URLs, inlining images!\n" + traceback.format_exc()
+                    )
+
+        messages = await cls._build_messages(promt, post_text, image_paths)
+        return await cls._complete(messages, priority, max_chars=max_chars)
 
     @classmethod
-    async def request_ai(cls, promt: str, post_text: str = None, image_paths: list[str] = None) -> str:
+    async def _build_messages(cls, promt: str, post_text: str = None, image_paths: list[str] = None, passthrough: bool = False) -> list[dict]:
         messages=[
             {
                 "role": "system",
@@ -29,28 +99,408 @@ class AiManager:
                 {"type": "text", "text": "Проанализируй эти изображения согласно инструкциям."}
             ]
 
-            for path in image_paths:
-                if path.startswith("http://") or path.startswith("https://"):
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(path) as resp:
-                            if resp.status != 200:
-                                raise Exception(f"Ошибка загрузки изображения: {path}")
-                            data = await resp.read()
-                            b64 = base64.b64encode(data).decode("utf-8")
-                            data_uri = f"data:image/jpeg;base64,{b64}"
-                else:
-                    if not os.path.exists(path):
-                        raise FileNotFoundError(f"Файл не найден: {path}")
-                    with open(path, "rb") as f:
-                        b64 = base64.b64encode(f.read()).decode("utf-8")
-                    data_uri = f"data:image/jpeg;base64,{b64}"
-
-                content.append({"type": "image_url", "image_url": {"url": data_uri}})
+            if passthrough:
+                content.extend(
+                    {"type": "image_url", "image_url": {"url": path}}
+                    for path in image_paths if is_remote(path)
+                )
+                image_paths = [path for path in image_paths if not is_remote(path)]
+            for data in await cls._load_images(image_paths):
+                content.append(await cls._image_part(data))
 
             messages.append({"role": "user", "content": content})
+        return messages
+
+    @classmethod
+    async def request_caption(cls, promt: str, image_path: str, priority: AiPriority = AiPriority.publish, max_chars: int = None) -> str:
+        """
+            Текст поста к фото. Готовая подпись кэшируется по хэшу содержимого фото и промта, так что повторная
+            публикация того же фото не платит за изображение.
+            С AI_CAPTIONS_FROM_DESCRIPTIONS фото один раз описывается моделью (описание кэшируется
+            по хэшу содержимого), а сам пост пишется текстовым запросом по описанию.
+        """
+        images = await cls._load_images([image_path])
+        content_hash = ImageOptimizer.content_hash(images[0]) if images else None
+        prompt_hash = hashlib.sha256(promt.encode("utf-8")).hexdigest()
+        if content_hash:
+            caption = await VisionCache.get_caption(content_hash, prompt_hash)
+            if caption is not None:
+                return cls._cut(caption, max_chars) if max_chars else caption
+
+        caption = None
+        if AI_CAPTIONS_FROM_DESCRIPTIONS:
+            description = await cls.describe_image(image_path, priority)
+            if description:
+                caption = await cls.request_ai(
+                    promt=promt,
+                    post_text=CAPTION_INSTRUCTION.format(description=description),
+                    priority=priority,
+                    max_chars=max_chars
+                )
+        if caption is None:
+            caption = await cls.request_ai(
+                promt=promt,
+                image_paths=[image_path],
+                priority=priority,
+                max_chars=max_chars
+            )
+
+        if caption and content_hash:
+            await VisionCache.put_caption(content_hash, prompt_hash, caption)
+        return caption
+
+    @classmethod
+    async def describe_image(cls, image_path: str, priority: AiPriority = AiPriority.background) -> str | None:
+        """
+            Краткое описание изображения из кэша или от модели. Одинаковые изображения описываются одним запросом.
+        """
+        images = await cls._load_images([image_path])
+        if not images:
+            return None
+        data = images[0]
+        content_hash = ImageOptimizer.content_hash(data)
+
+        description = await VisionCache.get(content_hash)
+        if description is not None:
+            return description
+
+        task = cls._DESCRIBING.get(content_hash)
+        if task is None:
+            task = asyncio.ensure_future(cls._describe(content_hash, data, priority))
+            cls._DESCRIBING[content_hash] = task
+            task.add_done_callback(lambda _: cls._DESCRIBING.pop(content_hash, None))
+        return await asyncio.shield(task)
+
+    @classmethod
+    async def _describe(cls, content_hash: str, data: bytes, priority: AiPriority) -> str | None:
+        messages = [
+            {"role": "system", "content": DESCRIBE_PROMPT},
+            {"role": "user", "content": [await cls._image_part(data)]},
+        ]
+        description = await cls._complete(messages, priority, max_chars=AI_DESCRIPTION_MAX_CHARS)
+        if description:
+            await VisionCache.put(content_hash, description)
+        return description
+
+    @staticmethod
+    async def _image_part(data: bytes) -> dict:
+        data, mime_type = await ImageOptimizer.prepare(data)
+        b64 = base64.b64encode(data).decode("utf-8")
+        data_uri = f"data:{mime_type};base64,{b64}"
+        return {"type": "image_url", "image_url": {"url": data_uri}}
+
+    @classmethod
+    def _router(cls) -> EndpointRouter:
+        """
+            Роутер эндпоинтов создается при первом запросе, чтобы ошибки конфигурации не ломали импорт модуля.
+        """
+        if cls._ROUTER is None:
+            cls._ROUTER = EndpointRouter.from_env()
+        return cls._ROUTER
+
+    @classmethod
+    def _http_session(cls) -> aiohttp.ClientSession:
+        """
+            Общая HTTP-сессия с пулом соединений для загрузки изображений.
+        """
+        if cls._HTTP is None or cls._HTTP.closed:
+            cls._HTTP = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=AI_HTTP_POOL_SIZE, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=AI_IMAGE_FETCH_TIMEOUT),
+            )
+        return cls._HTTP
+
+    @classmethod
+    async def close(cls):
+        if cls._HTTP is not None:
+            await cls._HTTP.close()
+            cls._HTTP = None
+        if cls._ROUTER is not None:
+            await cls._ROUTER.close()
+            cls._ROUTER = None
 
-        response = await cls._CLIENT.chat.completions.create(
-            model=cls._MODEL,
+    @classmethod
+    async def _load_images(cls, paths: list[str]) -> list[bytes]:
+        """
+            Загружает изображения запроса параллельно, не более AI_IMAGE_FETCH_CONCURRENCY одновременно.
+            Удаленные изображения, которые не удалось скачать или которые больше лимита, пропускаются.
+        """
+        semaphore = asyncio.Semaphore(AI_IMAGE_FETCH_CONCURRENCY)
+
+        async def load(path: str) -> bytes | None:
+            async with semaphore:
+                if is_remote(path):
+                    return await cls._download_image(path)
+                return await cls._read_image(path)
+
+        images = await asyncio.gather(*(load(path) for path in paths))
+        return [image for image in images if image is not None]
+
+    @classmethod
+    async def _download_image(cls, url: str) -> bytes | None:
+        try:
+            async with cls._http_session().get(url) as resp:
+                if resp.status != 200:
+                    ai_logger.warning(f"Image {url} was skipped: HTTP {resp.status}.")
+                    return None
+                if resp.content_length and resp.content_length > AI_IMAGE_MAX_BYTES:
+                    ai_logger.warning(f"Image {url} was skipped: {resp.content_length} bytes is over the limit.")
+                    return None
+
+                data = bytearray()
+                async for chunk in resp.content.iter_chunked(64 * 1024):
+                    data.extend(chunk)
+                    if len(data) > AI_IMAGE_MAX_BYTES:
+                        ai_logger.warning(f"Image {url} was skipped: it is over the size limit.")
+                        return None
+                return bytes(data)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            ai_logger.warning(
+                f"A error was occured while downloading image {url}!\n" + traceback.format_exc()
+            )
+            return None
+
+    @staticmethod
+    async def _read_image(path: str) -> bytes:
+        try:
+            size = (await aiofiles.os.stat(path)).st_size
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Файл не найден: {path}")
+        if size > AI_IMAGE_MAX_BYTES:
+            raise ValueError(f"Файл слишком большой: {path}")
+        async with aiofiles.open(path, "rb") as f:
+            return await f.read()
+
+    @classmethod
+    async def request_posts(cls, promt: str, count: int, priority: AiPriority = AiPriority.background, max_chars: int = None) -> list[str]:
+        """
+            Генерирует count постов одним запросом: системный промт персоны отправляется один раз,
+            модель возвращает JSON со списком постов.
+            Если ответ не разобрался или постов меньше, недостающие дозапрашиваются по одному.
+        """
+        posts = []
+        if count > 1:
+            messages = [
+                {"role": "system", "content": promt},
+                {"role": "user", "content": BATCH_INSTRUCTION.format(count=count)},
+            ]
+            content = await cls._complete(
+                messages, priority,
+                max_tokens=count * cls._max_tokens(max_chars) if max_chars else None
+            )
+            try:
+                posts = cls._parse_posts(content)[:count]
+                if max_chars:
+                    posts = [cls._cut(post, max_chars) for post in posts]
+            except ValueError:
+                ai_logger.warning(
+                    f"A batch of {count} posts could not be parsed, falling back to single requests!\n" + traceback.format_exc()
+                )
+
+        while len(posts) < count:
+            posts.append(await cls.request_ai(promt=promt, priority=priority, max_chars=max_chars))
+        return posts
+
+    @staticmethod
+    def _parse_posts(content: str | None) -> list[str]:
+        """
+            Достает список постов из ответа модели: {"posts": [...]} или просто [...], в том числе внутри ```-блока.
+        """
+        if not content:
+            raise ValueError("Empty batch response")
+        content = content.strip()
+        if content.startswith("```"):
+            content = content.strip("`")
+            content = content[content.find("\n") + 1:]
+
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError:
+            start = min((i for i in (content.find("{"), content.find("[")) if i != -1), default=-1)
+            end = max(content.rfind("}"), content.rfind("]"))
+            if start == -1 or end <= start:
+                raise ValueError("Batch response contains no JSON")
+            data = json.loads(content[start:end + 1])
+
+        if isinstance(data, dict):
+            data = data.get("posts")
+        if not isinstance(data, list):
+            raise ValueError("Batch response has no posts list")
+
+        posts = []
+        for item in data:
+            if isinstance(item, dict):
+                item = item.get("text")
+            if isinstance(item, str) and item.strip() and item.strip() not in posts:
+                posts.append(item.strip())
+        if not posts:
+            raise ValueError("Batch response has no valid posts")
+        return posts
+
+    @staticmethod
+    def _max_tokens(max_chars: int) -> int:
+        """
+            Потолок max_tokens для ответа в max_chars символов с небольшим запасом.
+        """
+        return math.ceil(max_chars / AI_CHARS_PER_TOKEN) + 16
+
+    @staticmethod
+    def _trim_sentence(text: str) -> str:
+        """
+            Отбрасывает оборванное предложение в конце обрезанного ответа, если законченное найдется во второй половине текста.
+        """
+        boundary = max(text.rfind(mark) for mark in ".!?…")
+        if boundary >= len(text) // 2:
+            return text[:boundary + 1]
+        return text
+
+    @staticmethod
+    def _cut(text: str, max_chars: int) -> str:
+        """
+            Обрезает текст до max_chars, по возможности по границе слова.
+        """
+        if len(text) <= max_chars:
+            return text
+        text = text[:max_chars]
+        boundary = text.rfind(" ")
+        if boundary > max_chars * 0.8:
+            text = text[:boundary]
+        return text.rstrip()
+
+    @classmethod
+    def is_busy(cls) -> bool:
+        """
+            Есть ли запросы, ожидающие своей очереди в ограничителе.
+        """
+        return cls._LIMITER.depth > 0
+
+    @staticmethod
+    def _estimate_tokens(messages: list[dict], completion_tokens: int) -> int:
+        """
+            Грубая оценка расхода токенов запроса для резервирования бюджета: ~4 символа на токен.
+        """
+        tokens = completion_tokens
+        for message in messages:
+            content = message["content"]
+            if isinstance(content, str):
+                tokens += len(content) // 4
+                continue
+            for part in content:
+                if part["type"] == "text":
+                    tokens += len(part["text"]) // 4
+                else:
+                    tokens += AI_IMAGE_TOKENS
+        return tokens
+
+    @classmethod
+    async def _complete(cls, messages: list[dict], priority: AiPriority, max_tokens: int = None, max_chars: int = None,
+                        endpoint: AiEndpoint = None, retries: int = AI_MAX_RETRIES) -> str:
+        """
+            Выполняет запрос через общий ограничитель с повторами (не больше retries) и возвращает текст ответа.
+            Каждая попытка уходит на эндпоинт, выбранный роутером (или на заданный endpoint).
+            На таймауты, сетевые и 5xx ошибки запрос сразу переключается на другой эндпоинт, а если его нет —
+            повторяется с экспоненциальной задержкой. На 429 эндпоинт выводится из ротации на Retry-After,
+            а если переключаться некуда — все запросы процесса ждут Retry-After.
+        """
+        if max_chars and not max_tokens:
+            max_tokens = cls._max_tokens(max_chars)
+        params = {"max_tokens": max_tokens} if max_tokens else {}
+        reserved = cls._estimate_tokens(messages, max_tokens or AI_COMPLETION_TOKENS)
+        attempt = 0
+        failed: set[AiEndpoint] = set()
+        while True:
+            target = endpoint or cls._router().pick(exclude=failed)
+            await cls._LIMITER.acquire(priority, reserved)
+            used = None
+            delay = 0
+            try:
+                if max_chars:
+                    content, used, first_token = await cls._stream(target, messages, max_chars, params)
+                else:
+                    # whole-response latency depends on the reply length, so it is kept out of routing stats
+                    first_token = None
+                    response = await target.client.chat.completions.create(
+                        model=target.model,
+                        messages=messages,
+                        **params
+                    )
+                    if response.usage:
+                        used = response.usage.total_tokens
+                    content = response.choices[0].message.content
+                target.record(first_token, ok=True)
+                cls._LIMITER.on_success()
+                return content
+            except openai.RateLimitError as e:
+                if attempt >= retries:
+                    raise
+                wait = retry_after(e)
+                if endpoint is None and cls._router().has_alternative(target, exclude=failed):
+                    target.hold(wait if wait is not None else backoff_delay(attempt))
+                    ai_logger.warning(
+                        f"AI endpoint {target.name} is rate limited, switching to another endpoint (attempt {attempt + 1})."
+                    )
+                else:
+                    backoff = cls._LIMITER.on_rate_limited(wait)
+                    ai_logger.warning(
+                        f"AI provider rate limit was hit, requests are paused for {backoff:.1f}s (attempt {attempt + 1})."
+                    )
+            except (openai.APIConnectionError, openai.InternalServerError, httpx.TransportError):
+                target.record(None, ok=False)
+                if attempt >= retries:
+                    raise
+                if endpoint is None and cls._router().has_alternative(target, exclude=failed):
+                    failed.add(target)
+                    ai_logger.warning(
+                        f"A error was occured while requesting AI endpoint {target.name}, switching to another endpoint!\n" + traceback.format_exc()
+                    )
+                else:
+                    delay = backoff_delay(attempt)
+                    ai_logger.warning(
+                        f"A error was occured while requesting AI endpoint {target.name}, retrying in {delay:.1f}s!\n" + traceback.format_exc()
+                    )
+            finally:
+                cls._LIMITER.release(reserved, used)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    @classmethod
+    async def _stream(cls, endpoint: AiEndpoint, messages: list[dict], max_chars: int, params: dict) -> tuple[str, int | None, float | None]:
+        """
+            Читает ответ потоком и закрывает соединение, как только набран max_chars символов.
+            Возвращает текст, фактический расход токенов, если провайдер успел его прислать, и время до первого токена.
+            Ответ, оборванный лимитом символов или max_tokens, обрезается до последнего законченного предложения.
+        """
+        started = time.monotonic()
+        stream = await endpoint.client.chat.completions.create(
+            model=endpoint.model,
             messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            **params
         )
-        return response.choices[0].message.content
\ No newline at end of file
+        chunks, length, used, truncated, first_token = [], 0, None, False, None
+        try:
+            async for chunk in stream:
+                if first_token is None:
+                    first_token = time.monotonic() - started
+                if chunk.usage:
+                    used = chunk.usage.total_tokens
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                if choice.finish_reason == "length":
+                    truncated = True
+                delta = choice.delta.content
+                if delta:
+                    chunks.append(delta)
+                    length += len(delta)
+                    if length >= max_chars:
+                        truncated = True
+                        break
+        finally:
+            await stream.close()
+
+        content = cls._cut("".join(chunks), max_chars)
+        if truncated:
+            content = cls._trim_sentence(content)
+        return content, used, first_token
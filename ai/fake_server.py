@@ -0,0 +1,145 @@
+from aiohttp import web
+import argparse
+import asyncio
+import random
+import json
+import time
+import os
+
+
+class FakeEndpoint:
+    """
+        Поддельный OpenAI-совместимый эндпоинт: отвечает с задержкой до первого токена ttft,
+        с долей ошибок 500 error_rate и с долей ответов 429 rate_limit_rate. Поддерживает потоковые ответы.
+    """
+    def __init__(self, name: str, ttft: float, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 text: str = "Тестовый ответ поддельного эндпоинта. Второе предложение ответа!"):
+        self.name = name
+        self.ttft = ttft
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.text = text
+        self.requests = 0
+        self.errors = 0
+        self.port: int = None
+        self._runner: web.AppRunner = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._chat)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _chat(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        self.requests += 1
+
+        roll = random.random()
+        if roll < self.error_rate:
+            self.errors += 1
+            return web.json_response({"error": {"message": "fake server error"}}, status=500)
+        if roll < self.error_rate + self.rate_limit_rate:
+            self.errors += 1
+            return web.json_response(
+                {"error": {"message": "fake rate limit"}}, status=429, headers={"retry-after": "1"}
+            )
+
+        await asyncio.sleep(self.ttft)
+        base = {"id": "fake", "created": int(time.time()), "model": body.get("model")}
+        usage = {"prompt_tokens": 10, "completion_tokens": len(self.text) // 2, "total_tokens": 10 + len(self.text) // 2}
+        if not body.get("stream"):
+            return web.json_response({
+                **base,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": self.text}}],
+                "usage": usage,
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        words = self.text.split(" ")
+        for index, word in enumerate(words):
+            last = index == len(words) - 1
+            await response.write(self._event({
+                **base,
+                "object": "chat.completion.chunk",
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": word if last else word + " "},
+                    "finish_reason": "stop" if last else None,
+                }],
+            }))
+            await asyncio.sleep(0.01)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            await response.write(self._event({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage}))
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    @staticmethod
+    def _event(data: dict) -> bytes:
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+async def run(requests: int, concurrency: int):
+    endpoints = [
+        FakeEndpoint("fast", ttft=0.05),
+        FakeEndpoint("slow", ttft=0.5),
+        FakeEndpoint("flaky", ttft=0.05, error_rate=0.3),
+    ]
+    for endpoint in endpoints:
+        await endpoint.start()
+
+    # the router reads its configuration on the first request
+    os.environ["AI_ENDPOINTS"] = json.dumps([
+        {"name": endpoint.name, "base_url": endpoint.base_url, "api_key": "fake", "model": "fake"}
+        for endpoint in endpoints
+    ])
+    from ai import router
+    router.AI_ENDPOINTS = os.environ["AI_ENDPOINTS"]
+    from ai.base import AiManager
+
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def one(index: int):
+        nonlocal failures
+        async with semaphore:
+            try:
+                await AiManager.request_ai(promt=f"Запрос {index}", max_chars=200)
+            except Exception:
+                failures += 1
+
+    try:
+        await asyncio.gather(*(one(index) for index in range(requests)))
+        print(f"{requests} requests, {failures} failed")
+        for fake, endpoint in zip(endpoints, AiManager._router().endpoints):
+            p50 = f"{endpoint.p50:.3f}s" if endpoint.p50 is not None else "-"
+            p95 = f"{endpoint.p95:.3f}s" if endpoint.p95 is not None else "-"
+            print(
+                f"{fake.name:>6}: {fake.requests} requests, {fake.errors} errors, "
+                f"to first token p50 {p50} / p95 {p95}, error rate {endpoint.error_rate:.2f}"
+            )
+    finally:
+        await AiManager.close()
+        for endpoint in endpoints:
+            await endpoint.stop()
+
+
+if __name__ == "__main__":
+    # python -m ai.fake_server — прогон роутинга запросов к ИИ на поддельных эндпоинтах
+    parser = argparse.ArgumentParser(description="Routes requests through AiManager to fake OpenAI-compatible endpoints.")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.concurrency))
@@ -0,0 +1,110 @@
+from collections import OrderedDict
+import hashlib
+import asyncio
+import io
+import os
+
+from config.logger import ai_logger
+
+try:
+    from PIL import Image, ImageOps
+except ImportError: # pillow is optional: without it images are sent as is
+    Image = None
+
+
+AI_IMAGE_MAX_EDGE = int(os.getenv("AI_IMAGE_MAX_EDGE", 1024))
+AI_IMAGE_FORMAT = os.getenv("AI_IMAGE_FORMAT", "jpeg").lower()
+AI_IMAGE_QUALITY = int(os.getenv("AI_IMAGE_QUALITY", 80))
+AI_IMAGE_CACHE_MB = int(os.getenv("AI_IMAGE_CACHE_MB", 64))
+
+MIME_TYPES = {
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+    "gif": "image/gif",
+}
+
+
+def sniff_mime(data: bytes) -> str:
+    """
+        MIME-тип изображения по сигнатуре файла; по умолчанию image/jpeg.
+    """
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return MIME_TYPES["png"]
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return MIME_TYPES["webp"]
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return MIME_TYPES["gif"]
+    return MIME_TYPES["jpeg"]
+
+
+class ImageOptimizer:
+    """
+        Подготовка изображений для запроса к ИИ: уменьшение до AI_IMAGE_MAX_EDGE по большей стороне
+        и перекодирование в AI_IMAGE_FORMAT. Результат кэшируется в памяти по хэшу исходных байтов.
+    """
+    _cache: OrderedDict[str, tuple[bytes, str]] = OrderedDict()
+    _cache_bytes = 0
+
+    @staticmethod
+    def content_hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    @classmethod
+    async def prepare(cls, data: bytes) -> tuple[bytes, str]:
+        """
+            Возвращает (байты, MIME-тип) изображения, готового к отправке.
+        """
+        if Image is None:
+            return data, sniff_mime(data)
+
+        key = cls.content_hash(data)
+        cached = cls._cache.get(key)
+        if cached is not None:
+            cls._cache.move_to_end(key)
+            return cached
+
+        try:
+            result = await asyncio.to_thread(cls._optimize, data)
+        except Exception:
+            ai_logger.warning(f"Image {key} could not be optimized, it is sent as is.")
+            result = (data, sniff_mime(data))
+        cls._remember(key, result)
+        return result
+
+    @classmethod
+    def _remember(cls, key: str, result: tuple[bytes, str]):
+        max_bytes = AI_IMAGE_CACHE_MB * 1024 * 1024
+        size = len(result[0])
+        if size > max_bytes:
+            return
+        # concurrent prepare() calls for the same image both end up here
+        previous = cls._cache.pop(key, None)
+        if previous is not None:
+            cls._cache_bytes -= len(previous[0])
+        cls._cache[key] = result
+        cls._cache_bytes += size
+        while cls._cache_bytes > max_bytes:
+            _, (old_data, _) = cls._cache.popitem(last=False)
+            cls._cache_bytes -= len(old_data)
+
+    @staticmethod
+    def _optimize(data: bytes) -> tuple[bytes, str]:
+        with Image.open(io.BytesIO(data)) as image:
+            image.seek(0)
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((AI_IMAGE_MAX_EDGE, AI_IMAGE_MAX_EDGE))
+
+            if AI_IMAGE_FORMAT == "jpeg" and image.mode != "RGB":
+                # jpeg has no alpha channel, transparent areas become white
+                rgba = image.convert("RGBA")
+                image = Image.new("RGB", rgba.size, (255, 255, 255))
+                image.paste(rgba, mask=rgba.getchannel("A"))
+
+            buffer = io.BytesIO()
+            image.save(buffer, format=AI_IMAGE_FORMAT.upper(), quality=AI_IMAGE_QUALITY, optimize=True)
+
+        optimized = buffer.getvalue()
+        if len(optimized) >= len(data):
+            return data, sniff_mime(data)
+        return optimized, MIME_TYPES[AI_IMAGE_FORMAT]
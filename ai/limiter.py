@@ -0,0 +1,190 @@
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from enum import IntEnum
+import itertools
+import asyncio
+import heapq
+import os
+
+
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", 8))
+AI_REQUESTS_PER_MINUTE = int(os.getenv("AI_REQUESTS_PER_MINUTE", 60))
+AI_TOKENS_PER_MINUTE = int(os.getenv("AI_TOKENS_PER_MINUTE", 100000))
+AI_MAX_RETRIES = int(os.getenv("AI_MAX_RETRIES", 3))
+AI_BACKOFF_BASE = float(os.getenv("AI_BACKOFF_BASE", 2))
+AI_BACKOFF_MAX = float(os.getenv("AI_BACKOFF_MAX", 60))
+
+
+class AiPriority(IntEnum):
+    """Приоритет запроса к ИИ: меньше — важнее."""
+    publish = 0
+    comment = 1
+    background = 2
+
+
+def backoff_delay(attempt: int) -> float:
+    return min(AI_BACKOFF_MAX, AI_BACKOFF_BASE * 2 ** attempt)
+
+
+def retry_after(error: Exception) -> float | None:
+    """
+        Задержка из заголовков retry-after-ms / retry-after ответа провайдера, если они есть.
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """Бюджет на минуту, пополняемый равномерно; per_minute = 0 снимает ограничение."""
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = float(per_minute)
+        self.updated: float = None
+
+    def _refill(self, now: float):
+        if self.updated is not None:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: int, now: float) -> float:
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: int, now: float):
+        if self.capacity:
+            self._refill(now)
+            self.level -= amount
+
+    def give(self, amount: int, now: float):
+        if self.capacity:
+            self._refill(now)
+            self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """
+        Общий на процесс ограничитель запросов к ИИ: число запросов в полете, бюджеты запросов и токенов в минуту.
+        Ожидающие обслуживаются по приоритету, затем по очереди. На 429 лимит параллельности
+        уменьшается вдвое и все запросы ждут Retry-After; после серии успешных ответов лимит растет обратно.
+    """
+    def __init__(self, max_concurrency: int, requests_per_minute: int, tokens_per_minute: int):
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self.in_flight = 0
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.blocked_until = 0.0
+        self.strikes = 0
+        self._successes = 0
+        self._waiters: list[tuple[int, int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._timer: asyncio.TimerHandle = None
+
+    @property
+    def depth(self) -> int:
+        """Количество запросов, ожидающих разрешения."""
+        return sum(1 for *_, future in self._waiters if not future.done())
+
+    async def acquire(self, priority: AiPriority, tokens: int):
+        """
+            Ждет разрешения на запрос, резервируя tokens из минутного бюджета.
+            После acquire обязательно вызвать release.
+        """
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), tokens, future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # the slot could have been granted right before the cancellation
+            if not future.cancelled():
+                self.release(tokens)
+            raise
+
+    def release(self, reserved: int, used: int = None):
+        """
+            Освобождает слот; если известен фактический расход токенов, разница с резервом возвращается в бюджет.
+        """
+        self.in_flight -= 1
+        if used is not None:
+            self.tokens.give(reserved - used, asyncio.get_running_loop().time())
+        self._dispatch()
+
+    def on_success(self):
+        self.strikes = 0
+        if self.concurrency < self.max_concurrency:
+            self._successes += 1
+            if self._successes >= self.concurrency:
+                self._successes = 0
+                self.concurrency += 1
+                self._dispatch()
+
+    def on_rate_limited(self, delay: float = None) -> float:
+        """
+            Реакция на 429: блокирует все запросы на delay (или экспоненциальную задержку) и уменьшает параллельность.
+        """
+        self.strikes += 1
+        self._successes = 0
+        self.concurrency = max(1, self.concurrency // 2)
+        if delay is None:
+            delay = backoff_delay(self.strikes - 1)
+        self.blocked_until = max(self.blocked_until, asyncio.get_running_loop().time() + delay)
+        return delay
+
+    def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._waiters:
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= self.concurrency:
+                return
+
+            now = loop.time()
+            delay = max(
+                self.blocked_until - now,
+                self.requests.wait_time(1, now),
+                self.tokens.wait_time(tokens, now),
+            )
+            if delay > 0:
+                self._timer = loop.call_later(delay, self._dispatch)
+                return
+
+            heapq.heappop(self._waiters)
+            self.requests.take(1, now)
+            self.tokens.take(tokens, now)
+            self.in_flight += 1
+            future.set_result(None)
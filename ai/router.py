@@ -0,0 +1,174 @@
+from openai import AsyncOpenAI
+from collections import deque
+from typing import Iterable
+import statistics
+import random
+import json
+import time
+import os
+
+
+AI_ENDPOINTS = os.getenv("AI_ENDPOINTS")
+AI_REQUEST_TIMEOUT = float(os.getenv("AI_REQUEST_TIMEOUT", 60))
+AI_IMAGE_URL_PASSTHROUGH = os.getenv("AI_IMAGE_URL_PASSTHROUGH", "False").lower() == "true"
+AI_URL_PASSTHROUGH_COOLDOWN = int(os.getenv("AI_URL_PASSTHROUGH_COOLDOWN", 600))
+AI_ROUTER_WINDOW = int(os.getenv("AI_ROUTER_WINDOW", 50))
+AI_ROUTER_MAX_FAILURES = int(os.getenv("AI_ROUTER_MAX_FAILURES", 3))
+AI_ROUTER_COOLDOWN = float(os.getenv("AI_ROUTER_COOLDOWN", 30))
+
+
+def parse_flag(value) -> bool:
+    """
+        Флаг из конфигурации: строки разбираются так же, как флаги окружения ("true" в любом регистре), прочее — через bool.
+    """
+    if isinstance(value, str):
+        return value.lower() == "true"
+    return bool(value)
+
+
+class AiEndpoint:
+    """
+        OpenAI-совместимый провайдер: клиент, модель, вес и скользящая статистика последних AI_ROUTER_WINDOW запросов.
+        Задержка считается до первого токена потокового ответа: время генерации зависит от длины ответа, а не от провайдера.
+        После AI_ROUTER_MAX_FAILURES ошибок подряд эндпоинт выводится из ротации на AI_ROUTER_COOLDOWN секунд.
+    """
+    def __init__(self, name: str, base_url: str, api_key: str, model: str, weight: float = 1.0,
+                 timeout: float = AI_REQUEST_TIMEOUT, image_url_passthrough: bool = AI_IMAGE_URL_PASSTHROUGH):
+        self.name = name
+        self.model = model
+        self.weight = weight
+        self.image_url_passthrough = image_url_passthrough
+        self.client = AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            timeout=timeout,
+            max_retries=0
+        )
+        self.latencies: deque[float] = deque(maxlen=AI_ROUTER_WINDOW)
+        self.outcomes: deque[bool] = deque(maxlen=AI_ROUTER_WINDOW)
+        self.failures = 0
+        self.available_at = 0.0
+        self.passthrough_disabled_until = 0.0
+
+    def _percentile(self, q: float) -> float | None:
+        if not self.latencies:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    @property
+    def p50(self) -> float | None:
+        return self._percentile(0.5)
+
+    @property
+    def p95(self) -> float | None:
+        return self._percentile(0.95)
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.available_at
+
+    def hold(self, seconds: float):
+        """
+            Выводит эндпоинт из ротации на seconds секунд.
+        """
+        self.available_at = max(self.available_at, time.monotonic() + seconds)
+
+    def record(self, latency: float | None, ok: bool):
+        """
+            Учитывает исход запроса; latency — время до первого токена или None, если оно не измерялось.
+        """
+        self.outcomes.append(ok)
+        if ok:
+            if latency is not None:
+                self.latencies.append(latency)
+            self.failures = 0
+            return
+        self.failures += 1
+        if self.failures >= AI_ROUTER_MAX_FAILURES:
+            self.hold(AI_ROUTER_COOLDOWN)
+
+    def score(self, default_latency: float) -> float:
+        """
+            Чем быстрее и надежнее эндпоинт, тем больше доля новых запросов. Ошибочный эндпоинт
+            получает небольшую долю, чтобы его восстановление было замечено.
+        """
+        latency = self.p95 or default_latency
+        return self.weight * max(1 - self.error_rate, 0.05) ** 2 / max(latency, 0.05)
+
+    def passthrough_enabled(self) -> bool:
+        return self.image_url_passthrough and time.monotonic() >= self.passthrough_disabled_until
+
+    def disable_passthrough(self):
+        self.passthrough_disabled_until = time.monotonic() + AI_URL_PASSTHROUGH_COOLDOWN
+
+
+class EndpointRouter:
+    """
+        Распределяет запросы между эндпоинтами пропорционально их весу, задержке до первого токена (p95) и доле ошибок.
+    """
+    def __init__(self, endpoints: list[AiEndpoint]):
+        self.endpoints = endpoints
+
+    @classmethod
+    def from_env(cls) -> 'EndpointRouter':
+        """
+            Эндпоинты из AI_ENDPOINTS — JSON-списка объектов с полями name, base_url, api_key, model
+            и необязательными weight, timeout, image_url_passthrough. Без него — один эндпоинт из AI_BASE_URL/API_KEY/MODEL.
+        """
+        if not AI_ENDPOINTS:
+            return cls([AiEndpoint(
+                name="default",
+                base_url=os.getenv("AI_BASE_URL"),
+                api_key=os.getenv("API_KEY"),
+                model=os.getenv("MODEL"),
+            )])
+
+        endpoints = []
+        for index, config in enumerate(json.loads(AI_ENDPOINTS)):
+            endpoints.append(AiEndpoint(
+                name=config.get("name") or f"endpoint-{index}",
+                base_url=config["base_url"],
+                api_key=config.get("api_key") or os.getenv("API_KEY"),
+                model=config.get("model") or os.getenv("MODEL"),
+                weight=float(config.get("weight", 1.0)),
+                timeout=float(config.get("timeout", AI_REQUEST_TIMEOUT)),
+                image_url_passthrough=parse_flag(config.get("image_url_passthrough", AI_IMAGE_URL_PASSTHROUGH)),
+            ))
+        return cls(endpoints)
+
+    def _candidates(self, exclude: Iterable[AiEndpoint] = ()) -> list[AiEndpoint]:
+        now = time.monotonic()
+        return [
+            endpoint for endpoint in self.endpoints
+            if endpoint not in exclude and endpoint.is_available(now)
+        ]
+
+    def pick(self, exclude: Iterable[AiEndpoint] = ()) -> AiEndpoint:
+        """
+            Выбирает эндпоинт для нового запроса. Если доступных не осталось, берет тот, что освободится раньше всех.
+        """
+        candidates = self._candidates(exclude)
+        if not candidates:
+            return min(self.endpoints, key=lambda endpoint: endpoint.available_at)
+        if len(candidates) == 1:
+            return candidates[0]
+
+        known = [endpoint.p95 for endpoint in candidates if endpoint.p95 is not None]
+        default_latency = statistics.median(known) if known else 1.0
+        return random.choices(
+            candidates,
+            weights=[endpoint.score(default_latency) for endpoint in candidates]
+        )[0]
+
+    def has_alternative(self, endpoint: AiEndpoint, exclude: Iterable[AiEndpoint] = ()) -> bool:
+        return any(candidate is not endpoint for candidate in self._candidates(exclude))
+
+    async def close(self):
+        for endpoint in self.endpoints:
+            await endpoint.client.close()
@@ -0,0 +1,76 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import os
+
+
+VISION_CACHE_SIZE = int(os.getenv("VISION_CACHE_SIZE", 512))
+VISION_CAPTION_TTL = int(os.getenv("VISION_CAPTION_TTL", 86400))
+
+
+class VisionCache:
+    """
+        Кэш описаний изображений по хэшу содержимого.
+        Описания хранятся в таблице image_descriptions, последние VISION_CACHE_SIZE держатся в памяти.
+        Готовые подписи к фото хранятся в image_captions по хэшу содержимого и промта VISION_CAPTION_TTL секунд,
+        чтобы повтор публикации после сбоя браузера не отправлял изображение модели заново.
+    """
+    _descriptions: OrderedDict[str, str] = OrderedDict()
+
+    @classmethod
+    def _remember(cls, content_hash: str, description: str):
+        cls._descriptions[content_hash] = description
+        cls._descriptions.move_to_end(content_hash)
+        while len(cls._descriptions) > VISION_CACHE_SIZE:
+            cls._descriptions.popitem(last=False)
+
+    @classmethod
+    async def get(cls, content_hash: str) -> str | None:
+        description = cls._descriptions.get(content_hash)
+        if description is not None:
+            cls._descriptions.move_to_end(content_hash)
+            return description
+
+        from database.models import async_session, ImageDescription
+
+        async with async_session() as session:
+            row = await session.get(ImageDescription, content_hash)
+            if row is None:
+                return None
+            description = row.description
+        cls._remember(content_hash, description)
+        return description
+
+    @classmethod
+    async def put(cls, content_hash: str, description: str):
+        from database.models import async_session, ImageDescription
+
+        cls._remember(content_hash, description)
+        async with async_session() as session:
+            row = await session.get(ImageDescription, content_hash)
+            if row is None:
+                row = ImageDescription(content_hash=content_hash)
+                session.add(row)
+            row.description, row.created_at = description, datetime.now()
+            await session.commit()
+
+    @classmethod
+    async def get_caption(cls, content_hash: str, prompt_hash: str) -> str | None:
+        from database.models import async_session, ImageCaption
+
+        async with async_session() as session:
+            row = await session.get(ImageCaption, (content_hash, prompt_hash))
+            if row is None or datetime.now() - row.created_at > timedelta(seconds=VISION_CAPTION_TTL):
+                return None
+            return row.caption
+
+    @classmethod
+    async def put_caption(cls, content_hash: str, prompt_hash: str, caption: str):
+        from database.models import async_session, ImageCaption
+
+        async with async_session() as session:
+            row = await session.get(ImageCaption, (content_hash, prompt_hash))
+            if row is None:
+                row = ImageCaption(content_hash=content_hash, prompt_hash=prompt_hash)
+                session.add(row)
+            row.caption, row.created_at = caption, datetime.now()
+            await session.commit()
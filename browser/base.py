@@ -1,68 +1,91 @@
-from playwright.async_api import async_playwright, Playwright, Page, BrowserContext, Browser
+from playwright.async_api import async_playwright, Playwright, Page, Locator, BrowserContext, Browser
 from playwright._impl import _errors
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.orm import selectinload
-from datetime import date, datetime, timedelta
-from pytz import timezone
+from datetime import datetime, timedelta
 from enum import Enum
 import traceback
-import asyncio
+import functools
 import random
-import copy
+import asyncio
+import time
 import re
 import os
 
 from config.logger import browser_logger, scheduler_logger
 from ai.base import AiManager
+from ai.limiter import AiPriority
 from bot.nofitications import notify_user
 from bot.handlers.client import ERROR_SIGN, SUCCESS_SIGN
-from database.models import async_session, Account, Persona, Schedule
+from database.models import async_session, Account, Persona
+from database.snapshots import AccountSnapshot
+from database.enums import DatabaseEnums
 from .exceptions import CustomExceptions
-from .enums import BrowserConstants
-from utils import generate_publish_times, get_chance
-
-
-def with_context(func):
+from .feed import extract_feed, scroll_feed
+from .waits import wait_for_selector, wait_for_response, wait_for_dom_quiet, is_publish_response, pace
+from .registry import SelectorRegistry
+from .network import NETWORK_DATA_PLANE, ResponseCollector
+from .routes import BlockingProfiles
+from .cache import AssetCache, ASSET_CACHE_ENABLED, ASSET_CACHE_DIR, ASSET_CACHE_MAX_MB
+from .cookies import CookieValidityCache
+from .storage import StorageSnapshots, STORAGE_STATE_MIN_INTERVAL
+from .operations import OperationQueue, Priority
+from .timers import TimerScheduler, SCHEDULER_TIMEZONE, scheduler_now
+from .planner import ActionPlanner
+from .drafts import DraftBuffer, DRAFTS_PER_ACCOUNT, DRAFT_REFILL_INTERVAL
+from utils import get_chance, LRUSet
+
+
+CONTEXT_IDLE_TIMEOUT = int(os.getenv("CONTEXT_IDLE_TIMEOUT", 600))
+PAGE_POOL_SIZE = int(os.getenv("PAGE_POOL_SIZE", 2))
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", 1))
+FEED_MODE = os.getenv("FEED_MODE", "scroll")
+FEED_RELOAD_INTERVAL = int(os.getenv("FEED_RELOAD_INTERVAL", 1800))
+FEED_MAX_EMPTY_SCROLLS = int(os.getenv("FEED_MAX_EMPTY_SCROLLS", 3))
+SEEN_POSTS_LIMIT = int(os.getenv("SEEN_POSTS_LIMIT", 5000))
+SESSION_MAX_PAGES = int(os.getenv("SESSION_MAX_PAGES", 2))
+REFRESH_DEBOUNCE = float(os.getenv("REFRESH_DEBOUNCE", 2))
+MAX_TEXT_LENGTH = 500 # threads limit for posts and replies
+
+
+def with_context(func=None, *, profile: str = "full", priority: Priority = Priority.stats, timeout: float = None,
+                 queued: bool = True):
     """
-        Декоратор для открытия контекста браузера и отдельной страницы.
+        Декоратор для получения страницы из постоянного контекста браузера сессии.
+        Операция выполняется через очередь сессии с приоритетом priority и дедлайном timeout секунд.
+        Долгие фоновые операции (queued=False) получают собственную страницу в обход очереди и не занимают ее воркеры.
+        profile — профиль блокировки ресурсов страницы на время операции (см. BlockingProfiles).
     """
+    if func is None:
+        return lambda func: with_context(func, profile=profile, priority=priority, timeout=timeout, queued=queued)
+
+    @functools.wraps(func)
     async def wrapper(self: 'Session', *args, **kwargs):
-        if ThreadsManager.browser is None:
-            await ThreadsManager.start_browser()
-        
-        proxy = self.account.proxy
-        if proxy:
-            try:
-                server = proxy.split('@')[0]
-            except ValueError:
-                await notify_user(
-                    self.account.owner_id,
-                    f"{ERROR_SIGN} Неправильный формат прокси для аккаунта {self.account.id}!"
-                )
-                return
-            try:
-                username = proxy.split('@')[1].split(':')[0]
-                password = proxy.split('@')[1].split(':')[1]
-            except ValueError:
-                pass
+        if not queued:
+            return await run(self, *args, **kwargs)
+        try:
+            return await self.operations.submit(
+                lambda: run(self, *args, **kwargs),
+                priority,
+                timeout
+            )
+        except asyncio.TimeoutError:
+            browser_logger.error(
+                f"Operation {func.__name__} for account {self.account.id} has exceeded its {timeout}s deadline!"
+            )
 
-        if not self.browser_context:
-            self.browser_context = await ThreadsManager.browser.new_context(
-                locale="de-DE",
-                storage_state={"cookies": self.account.cookies} if self.account.cookies else None,
-                proxy={
-                    'server': server,
-                    'username': username,
-                    'password': password
-                } if self.account.proxy else None
-            )
-
-        new_page = await self.browser_context.new_page()
-        self.pages.append(new_page)
+    async def run(self: 'Session', *args, **kwargs):
+        new_page = await self._acquire_page()
+        if new_page is None:
+            return
         
         try:
-            return await func(self, *args, page=new_page, **kwargs)
+            await BlockingProfiles.apply(new_page, profile)
+
+            result = await func(self, *args, page=new_page, **kwargs)
+            if result:
+                await self._save_storage_state()
+            return result
         except _errors.Error as e:
             msg = str(e)
             if "net::ERR_INVALID_AUTH_CREDENTIALS" in msg:
@@ -83,35 +106,245 @@ def with_context(func):
                     f"{ERROR_SIGN} Произошла ошибка работы браузера для аккаунта {self.account.id}!"
                 )
         finally:
-            if new_page:
-                await new_page.close()
-                self.pages.remove(new_page)
-            if self.browser_context and not self.pages:
-                await self.browser_context.close()
-                self.browser_context = None
+            await self._release_page(new_page)
     
     return wrapper
 
 class Session:
     """Представляет сессию одного аккаунта в браузере."""
-    def __init__(self, account: Account):
+    def __init__(self, account: AccountSnapshot):
         self.account = account
+        self.browser: Browser = None
         self.browser_context: BrowserContext = None
         self.pages: list[Page] = []
-        self.scheduler = AsyncIOScheduler(timezone=timezone("Europe/Moscow"))
+        self.idle_pages: list[Page] = []
+        self.context_refs: int = 0
+        self.context_lock = asyncio.Lock()
+        self.context_eviction_task: asyncio.Task = None
+        self.storage_saved_at: float = None
+        self.operations = OperationQueue(SESSION_MAX_PAGES)
+
+        self.seen_posts = LRUSet(SEEN_POSTS_LIMIT)
+        self.drafts_lock = asyncio.Lock()
 
         self.working_task: asyncio.Task = None
         self.stop_work_event: asyncio.Event = None
 
-        self.scheduler.start()
+    async def _open_context(self) -> BrowserContext | None:
+        """
+            Создает контекст браузера с cookie и прокси аккаунта.
+        """
+        browser = await ThreadsManager.get_browser()
+        if browser is None:
+            return
+
+        proxy_settings = None
+        proxy = self.account.proxy
+        if proxy:
+            try:
+                server = proxy.split('@')[0]
+            except ValueError:
+                await notify_user(
+                    self.account.owner_id,
+                    f"{ERROR_SIGN} Неправильный формат прокси для аккаунта {self.account.id}!"
+                )
+                return
+            proxy_settings = {'server': server}
+            try:
+                proxy_settings['username'] = proxy.split('@')[1].split(':')[0]
+                proxy_settings['password'] = proxy.split('@')[1].split(':')[1]
+            except (ValueError, IndexError):
+                pass
+
+        context = await browser.new_context(
+            locale="de-DE",
+            storage_state=await self._initial_storage_state(),
+            proxy=proxy_settings
+        )
+        if ThreadsManager.asset_cache:
+            await context.route("**/*", ThreadsManager.asset_cache.handle_route)
+        self.browser = browser
+        for _ in range(PAGE_POOL_SIZE):
+            self.idle_pages.append(await context.new_page())
+
+        browser_logger.info(
+            f"A browser context for account {self.account.id} has been opened!"
+        )
+        return context
+
+    async def _initial_storage_state(self) -> dict | None:
+        """
+            Состояние для нового контекста: сохраненный снимок storage_state, если его cookie совпадают с cookie из БД.
+            Если cookie в БД поменялись (например, через бота), берутся они, а localStorage — из снимка.
+        """
+        snapshot = await StorageSnapshots.load(self.account.id)
+        cookies = self.account.cookies
+        if snapshot and (
+            not cookies
+            or CookieValidityCache.cookies_hash(snapshot.get("cookies", [])) == CookieValidityCache.cookies_hash(cookies)
+        ):
+            return snapshot
+        if cookies:
+            return {
+                "cookies": cookies,
+                "origins": snapshot.get("origins", []) if snapshot else []
+            }
+        return None
+
+    async def _save_storage_state(self, force: bool = False):
+        """
+            Сохраняет storage_state() контекста на диск (не чаще STORAGE_STATE_MIN_INTERVAL секунд)
+            и синхронизирует cookie в БД, если они изменились.
+        """
+        if not self.browser_context:
+            return
+        now = time.monotonic()
+        if not force and self.storage_saved_at and now - self.storage_saved_at < STORAGE_STATE_MIN_INTERVAL:
+            return
+        self.storage_saved_at = now
+
+        try:
+            state = await self.browser_context.storage_state(indexed_db=True)
+            await StorageSnapshots.save(self.account.id, state)
+
+            cookies = state.get("cookies", [])
+            if cookies and CookieValidityCache.cookies_hash(cookies) != CookieValidityCache.cookies_hash(self.account.cookies or []):
+                async with async_session() as session:
+                    # bulk update does not fire ORM listeners, so no refresh of the session is triggered
+                    await session.execute(
+                        update(Account)
+                        .where(Account.id == self.account.id)
+                        .values(cookies=cookies)
+                    )
+                    await session.commit()
+                self.account = self.account.evolve(cookies=cookies)
+                await CookieValidityCache.remember(self.account.id, cookies)
+        except Exception:
+            browser_logger.error(
+                f"A error was occured while saving storage state for account {self.account.id}!\n" + traceback.format_exc()
+            )
+
+    async def _acquire_page(self) -> Page | None:
+        """
+            Берет страницу из пула (или создает новую) в постоянном контексте аккаунта.
+            Контекст создается при первом обращении и живет, пока на него есть ссылки.
+        """
+        async with self.context_lock:
+            if self.context_eviction_task:
+                self.context_eviction_task.cancel()
+                self.context_eviction_task = None
+
+            if not self.browser_context:
+                self.browser_context = await self._open_context()
+                if not self.browser_context:
+                    return
+
+            page = None
+            while self.idle_pages and page is None:
+                candidate = self.idle_pages.pop()
+                if not candidate.is_closed():
+                    page = candidate
+            if page is None:
+                page = await self.browser_context.new_page()
+
+            self.context_refs += 1
+            self.pages.append(page)
+            return page
+
+    async def _release_page(self, page: Page):
+        """
+            Возвращает страницу в пул. Если ссылок на контекст не осталось, планирует его закрытие.
+        """
+        async with self.context_lock:
+            if page in self.pages:
+                self.pages.remove(page)
+            self.context_refs = max(self.context_refs - 1, 0)
+
+            if not page.is_closed():
+                if self.browser_context and len(self.idle_pages) < PAGE_POOL_SIZE:
+                    try:
+                        await page.goto("about:blank")
+                        self.idle_pages.append(page)
+                    except _errors.Error:
+                        await page.close()
+                else:
+                    await page.close()
+
+            if self.browser_context and not self.context_refs:
+                self.context_eviction_task = asyncio.create_task(
+                    self._evict_context_when_idle()
+                )
+
+    async def _evict_context_when_idle(self):
+        """
+            Закрывает контекст после CONTEXT_IDLE_TIMEOUT секунд простоя.
+        """
+        try:
+            await asyncio.sleep(CONTEXT_IDLE_TIMEOUT)
+        except asyncio.CancelledError:
+            return
+        async with self.context_lock:
+            if self.context_refs:
+                return
+            self.context_eviction_task = None
+            await self._close_context()
+
+    async def _close_context(self):
+        """
+            Закрывает контекст браузера и все страницы пула.
+            Перед закрытием состояние сохраняется без учета STORAGE_STATE_MIN_INTERVAL, чтобы не потерять
+            изменения последних операций.
+        """
+        if self.browser_context:
+            await self._save_storage_state(force=True)
+            try:
+                await self.browser_context.close()
+            except _errors.Error:
+                browser_logger.error(
+                    f"A error was occured while closing browser context for account {self.account.id}!\n" + traceback.format_exc()
+                )
+            browser_logger.info(
+                f"A browser context for account {self.account.id} has been closed!"
+            )
+        self.browser = None
+        self.browser_context = None
+        self.idle_pages.clear()
+        self.pages.clear()
+        self.context_refs = 0
+
+    def _drop_context(self):
+        """
+            Забывает контекст, браузер которого упал. Следующая операция откроет контекст
+            в наименее загруженном браузере пула.
+        """
+        self.browser = None
+        self.browser_context = None
+        self.idle_pages.clear()
+
+    @property
+    def queue_depth(self) -> int:
+        """Количество браузерных операций, ожидающих в очереди сессии."""
+        return self.operations.depth
 
-    async def start_working(self, schedule: Schedule):
+    async def close(self):
+        """
+            Освобождает ресурсы сессии: отменяет очередь операций, отложенное закрытие и закрывает контекст.
+        """
+        await self.operations.close()
+        if self.context_eviction_task:
+            self.context_eviction_task.cancel()
+            self.context_eviction_task = None
+        async with self.context_lock:
+            await self._close_context()
+
+    async def start_working(self):
         """
             Главная функция работы аккаунта.
-            Запускает планировщик, чтение ленты новостей.
+            Запускает чтение ленты новостей. Публикации планируются заранее в planned_actions.
         """
+        if self.working_task and not self.working_task.done():
+            return
         self.stop_work_event = asyncio.Event()
-        await self._schedule_posts(schedule)
         self.working_task = asyncio.create_task(
             self._scroll_feeds()
         )
@@ -143,113 +376,106 @@ class Session:
 
     async def _configure_scheduler(self):
         """
-            Создает расписание работы, публикации постов и переконфигурация расписания на завтра.
+            Достраивает план действий аккаунта в planned_actions и ставит в планировщик действия ближайшего горизонта.
+            Также планирует свой повторный запуск на следующие сутки.
         """
         browser_logger.info(
             f"Starting scheduler for account {self.account.id}..."
         )
-        self.scheduler.remove_all_jobs()
-
-        today_date = date.today()
-        tomorrow_date = today_date + timedelta(days=1)
+        ThreadsManager.timers.cancel_account(self.account.id)
 
-        tomorrows_sessions = []
+        await ActionPlanner.sync_account(self.account)
 
-        async def schedule_day(day_date):
-            for schedule in self.account.schedules:
-                if schedule.day_of_week == day_date.weekday():
-                    start_dt = datetime.combine(day_date, schedule.start_time)
-                    end_dt = datetime.combine(day_date, schedule.end_time)
+        for action_id, kind, due_at in await ActionPlanner.load_due(self.account.id):
+            ThreadsManager.timers.add(
+                self.account.id, kind.value, due_at,
+                self._run_planned_action, action_id, kind
+            )
+            scheduler_logger.info(
+                f"Account {self.account.id} got a {kind.value} job at {due_at.strftime('%d/%m/%Y, %H:%M:%S')}!"
+            )
 
-                    if start_dt > datetime.now():
-                        self.scheduler.add_job(
-                            self.start_working,
-                            'date',
-                            args=[schedule],
-                            next_run_time=start_dt
-                        )
-                        
-                        scheduler_logger.info(
-                            f"Account {self.account.id} got a start job at {start_dt.strftime('%d/%m/%Y, %H:%M:%S')}!"
-                        )
-                    elif start_dt < datetime.now() < end_dt:
-                        await self.start_working(schedule)
-                    
-                    if end_dt > datetime.now():
-                        self.scheduler.add_job(
-                            self.stop_working,
-                            'date',
-                            next_run_time=end_dt
-                        )
-                        scheduler_logger.info(
-                            f"Account {self.account.id} got an end job at {end_dt.strftime('%d/%m/%Y, %H:%M:%S')}!"
-                        )
-                    if day_date == tomorrow_date:
-                        tomorrows_sessions.append(schedule)
-
-        await schedule_day(today_date)
-        await schedule_day(tomorrow_date)
-
-        if tomorrows_sessions:
-            last_session = sorted(tomorrows_sessions, key=lambda s: s.end_time)[-1]
-            next_run_time = datetime.combine(tomorrow_date, last_session.end_time)
-        else:
-            next_run_time = datetime.now() + timedelta(days=1)
-
-        self.scheduler.add_job(
-            self._configure_scheduler,
-            'date',
-            next_run_time=next_run_time
+        # due times are built in the scheduler timezone, not on the host clock
+        next_run_time = SCHEDULER_TIMEZONE.localize(
+            datetime.combine(scheduler_now().date() + timedelta(days=1), datetime.min.time()) + timedelta(minutes=5)
+        )
+        ThreadsManager.timers.add(
+            self.account.id, "configure", next_run_time,
+            self._configure_scheduler
         )
         scheduler_logger.info(
             f"Account {self.account.id} got a configure job at {next_run_time.strftime('%d/%m/%Y, %H:%M:%S')}!"
         )
 
-    async def _check_myslef(self):
+        # refills are spread over the interval so accounts don't hit the AI at the same moment
+        ThreadsManager.timers.add(
+            self.account.id, "drafts", datetime.now(SCHEDULER_TIMEZONE) + timedelta(seconds=random.uniform(0, DRAFT_REFILL_INTERVAL)),
+            self._fill_drafts,
+            interval=timedelta(seconds=DRAFT_REFILL_INTERVAL)
+        )
+
+        # the process was restarted in the middle of a work window
+        if await ActionPlanner.has_open_window(self.account.id):
+            await self.start_working()
+
+    async def _run_planned_action(self, action_id: int, kind: DatabaseEnums.PlannedActionKind):
         """
-            Проверяет валидность данных аккаунта: авторизационные данные.
+            Выполняет действие из planned_actions и отмечает его результат: выполнено, не удалось
+            или пропущено, если публикация пришлась на время, когда аккаунт не работает.
         """
-        if self.account.cookies:
-            if await self._check_cookie_validness():
-                return True
-            else:
-                raise CustomExceptions.CookieInvalid
-        else:
-            raise CustomExceptions.NoCookiesProvided
+        Status = DatabaseEnums.PlannedActionStatus
+        status = Status.done
+        try:
+            if kind == DatabaseEnums.PlannedActionKind.start:
+                await self.start_working()
+            elif kind == DatabaseEnums.PlannedActionKind.stop:
+                await self.stop_working()
+            elif kind == DatabaseEnums.PlannedActionKind.publish:
+                if not self.stop_work_event or self.stop_work_event.is_set():
+                    status = Status.missed
+                elif not await self._publish_ai_post():
+                    status = Status.failed
+        except Exception:
+            status = Status.failed
+            scheduler_logger.error(
+                f"A error was occured while running a {kind.value} action for account {self.account.id}!\n" + traceback.format_exc()
+            )
+        await ActionPlanner.set_status(action_id, status)
 
-    async def _schedule_posts(self, schedule: Schedule):
+    async def _check_myslef(self):
         """
-            Создает задачи для публикации постов.
+            Проверяет валидность данных аккаунта: авторизационные данные.
+            Сначала смотрит срок жизни cookie и кэш проверок, затем делает легкий запрос без рендеринга,
+            и только если он ничего не показал — полную проверку через страницу.
         """
-        today = date.today()
-        start_dt = datetime.combine(today, schedule.start_time)
-        end_dt = datetime.combine(today, schedule.end_time)
-
-        now = datetime.now()
-
-        publish_times = generate_publish_times(
-            start_dt=start_dt,
-            end_dt=end_dt,
-            post_count=schedule.post_count,
-            jitter_spread=0.2,
-            min_margin=timedelta(seconds=5)
-        )
-
-        for pt in publish_times:
-            if pt <= now:
-                continue
-            self.scheduler.add_job(
-                self._publish_ai_post,
-                'date',
-                next_run_time=pt
+        cookies = self.account.cookies
+        if not cookies:
+            raise CustomExceptions.NoCookiesProvided
+        if not CookieValidityCache.has_live_session_cookie(cookies):
+            browser_logger.error(
+                f"{self.account.id} account's session cookie is missing or expired!"
             )
-            scheduler_logger.info(
-                f"Account {self.account.id} sheduled a publish post job at {pt.strftime('%d/%m/%Y, %H:%M:%S')}!"
+            raise CustomExceptions.CookieInvalid
+        if await CookieValidityCache.is_fresh(self.account.id, cookies):
+            browser_logger.info(
+                f"{self.account.id} account's cookie was recently checked, skipping the check."
             )
+            return True
 
-    async def _parse_promt(self, promt: str):
+        is_valid = await self._check_cookie_light()
+        if is_valid is None:
+            is_valid = await self._check_cookie_validness()
+
+        if is_valid:
+            await CookieValidityCache.remember(self.account.id, cookies)
+            return True
+        CookieValidityCache.forget(self.account.id)
+        raise CustomExceptions.CookieInvalid
+
+    async def _parse_promt(self, promt: str, notify: bool = True):
         """
             Принимает промт и заменяет поля [ ] на данные из аккаунта.
+            С notify=False ошибки промта не отправляются пользователю (для фоновой генерации).
         """
         def _parse(match):
             attr_label = match.group(1)
@@ -259,11 +485,12 @@ class Session:
                     attr_name = key
                     break
             else:
-                loop = asyncio.get_running_loop()
-                loop.create_task(notify_user(
-                    self.account.owner.id,
-                    f"{ERROR_SIGN} Ошибка в промте! Поля {attr_label} не существует!"
-                ))
+                if notify:
+                    loop = asyncio.get_running_loop()
+                    loop.create_task(notify_user(
+                        self.account.owner_id,
+                        f"{ERROR_SIGN} Ошибка в промте! Поля {attr_label} не существует!"
+                    ))
                 return
 
             if hasattr(self.account.persona, attr_name):
@@ -272,33 +499,117 @@ class Session:
                         return attr.value
                     return str(attr)
                 return
-            loop = asyncio.get_running_loop()
-            loop.create_task(notify_user(
-                self.account.owner.id,
-                f"{ERROR_SIGN} Ошибка в промте! Поля {attr_label} не существует!"
-            ))
+            if notify:
+                loop = asyncio.get_running_loop()
+                loop.create_task(notify_user(
+                    self.account.owner_id,
+                    f"{ERROR_SIGN} Ошибка в промте! Поля {attr_label} не существует!"
+                ))
             return
 
         raw_promt = promt
         if raw_promt:
             return re.sub(r"\[(.*?)\]", _parse, raw_promt)
-        await notify_user(
-            self.account.owner.id,
-            f"{ERROR_SIGN} Ошибка в промте! Промт пуст!"
-        )
+        if notify:
+            await notify_user(
+                self.account.owner_id,
+                f"{ERROR_SIGN} Ошибка в промте! Промт пуст!"
+            )
         return
 
+    async def _draft_prompts(self) -> tuple[str | None, str | None]:
+        persona = self.account.persona
+        if not persona:
+            return None, None
+        return (
+            await self._parse_promt(persona.text_prompt, notify=False),
+            await self._parse_promt(persona.photo_prompt, notify=False),
+        )
+
+    async def _fill_drafts(self):
+        """
+            Дозаполняет буфер черновиков: DRAFTS_PER_ACCOUNT текстов постов и подпись к следующему медиа.
+            Генерация идет с фоновым приоритетом и прерывается, как только у ИИ появляется очередь.
+            Пока идет одно дозаполнение, повторные запуски пропускаются.
+        """
+        if self.drafts_lock.locked():
+            return
+        async with self.drafts_lock:
+            try:
+                text_prompt, photo_prompt = await self._draft_prompts()
+
+                if text_prompt:
+                    prompt_hash = DraftBuffer.prompt_hash(text_prompt)
+                    missing = DRAFTS_PER_ACCOUNT - await DraftBuffer.count(self.account.id, DatabaseEnums.DraftKind.text, prompt_hash)
+                    if missing > 0:
+                        if AiManager.is_busy():
+                            return
+                        post_texts = await AiManager.request_posts(
+                            promt=text_prompt,
+                            count=missing,
+                            priority=AiPriority.background,
+                            max_chars=MAX_TEXT_LENGTH
+                        )
+                        for post_text in post_texts:
+                            if not await DraftBuffer.add(
+                                self.account.id, DatabaseEnums.DraftKind.text, prompt_hash, post_text[:MAX_TEXT_LENGTH],
+                                limit=DRAFTS_PER_ACCOUNT
+                            ):
+                                break
+
+                if photo_prompt and self.account.medias:
+                    media = self.account.medias[0]
+                    prompt_hash = DraftBuffer.prompt_hash(photo_prompt)
+                    ready = await DraftBuffer.count(self.account.id, DatabaseEnums.DraftKind.caption, prompt_hash, media_id=media.id)
+                    if not ready and not AiManager.is_busy() and os.path.exists(media.filepath):
+                        post_text = await AiManager.request_caption(
+                            promt=photo_prompt,
+                            image_path=media.filepath,
+                            priority=AiPriority.background,
+                            max_chars=MAX_TEXT_LENGTH
+                        )
+                        await DraftBuffer.add(
+                            self.account.id, DatabaseEnums.DraftKind.caption, prompt_hash, post_text[:MAX_TEXT_LENGTH],
+                            media_id=media.id, limit=1
+                        )
+            except Exception:
+                browser_logger.error(
+                    f"A error was occured while generating drafts for account {self.account.id}!\n" + traceback.format_exc()
+                )
+
+    async def _prune_drafts(self):
+        """
+            Удаляет черновики, которые больше не соответствуют персоне или медиа аккаунта.
+        """
+        text_prompt, photo_prompt = await self._draft_prompts()
+        await DraftBuffer.prune(
+            self.account.id,
+            {
+                DatabaseEnums.DraftKind.text: text_prompt and DraftBuffer.prompt_hash(text_prompt),
+                DatabaseEnums.DraftKind.caption: photo_prompt and DraftBuffer.prompt_hash(photo_prompt),
+            },
+            [media.id for media in self.account.medias]
+        )
+
     async def _publish_ai_post(self):
         """Публикует пост с помощью ИИ"""
         if self.stop_work_event and not self.stop_work_event.is_set():
             promt = await self._parse_promt(self.account.persona.text_prompt)
 
             if promt:
-                post_text = await AiManager.request_ai(
-                    promt=promt
+                post_text = await DraftBuffer.take(
+                    self.account.id, DatabaseEnums.DraftKind.text, DraftBuffer.prompt_hash(promt)
                 )
+                if post_text is None:
+                    post_text = await AiManager.request_ai(
+                        promt=promt,
+                        priority=AiPriority.publish,
+                        max_chars=MAX_TEXT_LENGTH
+                    )
 
-                if await self._create_text_post(post_text=post_text[:500]):
+                if not post_text:
+                    return False
+                if await self._create_text_post(post_text=post_text[:MAX_TEXT_LENGTH]):
                     browser_logger.info(
                         f"Account {self.account.id} published a text post at {datetime.now().strftime('%d/%m/%Y, %H:%M:%S')}!"
                     )
@@ -306,6 +617,12 @@ class Session:
                         self.account.owner_id,
                         f"{SUCCESS_SIGN} Аккаунт {self.account.username} выложил новый пост!"
                     )
+                    return True
+                # the text is already paid for, the next attempt reuses it
+                await DraftBuffer.add(
+                    self.account.id, DatabaseEnums.DraftKind.text, DraftBuffer.prompt_hash(promt), post_text
+                )
+        return False
     
     async def _publish_ai_media_post(self):
         """
@@ -318,15 +635,28 @@ class Session:
             photo = self.account.medias[0]
 
             if prompt and photo:
-                post_text = await AiManager.request_ai(
-                    promt=prompt,
-                    image_paths=[photo.filepath]
+                post_text = await DraftBuffer.take(
+                    self.account.id, DatabaseEnums.DraftKind.caption, DraftBuffer.prompt_hash(prompt),
+                    media_id=photo.id
                 )
+                if post_text is None:
+                    post_text = await AiManager.request_caption(
+                        promt=prompt,
+                        image_path=photo.filepath,
+                        priority=AiPriority.publish,
+                        max_chars=MAX_TEXT_LENGTH
+                    )
 
-                await self._create_media_post(
-                    post_text=post_text[:500],
+                if not await self._create_media_post(
+                    post_text=post_text[:MAX_TEXT_LENGTH],
                     media_path=photo.filepath
-                )
+                ):
+                    # the caption is already paid for, the next attempt reuses it
+                    await DraftBuffer.add(
+                        self.account.id, DatabaseEnums.DraftKind.caption, DraftBuffer.prompt_hash(prompt), post_text,
+                        media_id=photo.id
+                    )
+                    return False
 
                 async with async_session() as session:
                     account = await session.scalar(
@@ -360,7 +690,33 @@ class Session:
                 f"{ERROR_SIGN} Произошла непредвиденная ошибка при отправке текстового поста с картинкой!"
             )
 
-    @with_context
+    @with_context(profile="auth", priority=Priority.auth, timeout=120)
+    async def _check_cookie_light(self, page: Page) -> bool | None:
+        """
+            Легкая проверка cookie одним HTTP-запросом через контекст аккаунта, без рендеринга страницы.
+            Возвращает None, если по ответу нельзя понять, валидны ли cookie.
+        """
+        try:
+            response = await page.request.get("https://www.threads.net/", timeout=20000)
+            if "login" in response.url.lower():
+                browser_logger.error(
+                    f"{self.account.id} account's cookie is invalid!"
+                )
+                return False
+            if response.ok and self.account.username:
+                body = await response.text()
+                if f'"{self.account.username.lower()}"' in body.lower():
+                    browser_logger.info(
+                        f"{self.account.id} account's cookie is valid!"
+                    )
+                    return True
+        except _errors.Error:
+            browser_logger.error(
+                f"A error was occured while checking cookie for account {self.account.id} with a request!\n" + traceback.format_exc()
+            )
+        return None
+
+    @with_context(profile="auth", priority=Priority.auth, timeout=180)
     async def _check_cookie_validness(self, page: Page) -> bool:
         """
             Проверяет валидность cookie аккаунта
@@ -381,19 +737,9 @@ class Session:
                     f"{self.account.id} account's cookie is invalid!"
                 )
                 return False
-            new_post_button = page.locator(
-                'div[id="barcelona-page-layout"] div div div[role="region"][tabindex="0"] div div[style="--x-paddingInline: var(--barcelona-columns-item-horizontal-padding);"] div div[role="button"][tabindex="0"]',
-            ).first
-
-            if not new_post_button:
-                browser_logger.error(
-                    f"{self.account.id} account's cookie is invalid!"
-                )
-                return False
-            
             try:
-                await new_post_button.wait_for(state="visible", timeout=15000)
-            except _errors.TimeoutError:
+                await SelectorRegistry.resolve(page, "new_post_button", timeout=15000)
+            except CustomExceptions.SelectorNotFound:
                 browser_logger.error(
                     f"{self.account.id} account's cookie is invalid!"
                 )
@@ -419,7 +765,7 @@ class Session:
                 f"{ERROR_SIGN} Произошла непредвиденная ошибка проверке cookie для аккаунта {self.account.id}!"
             )
 
-    @with_context
+    @with_context(profile="auth", priority=Priority.auth, timeout=180)
     async def _set_cookie(self, page: Page):
         """
             Обновление cookie с помощью авторизации по лоигну и паролю
@@ -427,9 +773,9 @@ class Session:
         browser_logger.info(
             f"Setting cookie for account {self.account.id}..."
         )
-        await page.goto("https://www.threads.com/login/")
-        await page.wait_for_load_state("load")
-        await asyncio.sleep(10)
+        await page.goto("https://www.threads.com/login/", wait_until="domcontentloaded")
+        if not await wait_for_selector(page, "form input[type='password']", timeout=30000):
+            raise CustomExceptions.SelectorNotFound("Login form has not loaded")
 
         form = await page.query_selector("form")
 
@@ -445,7 +791,6 @@ class Session:
             try:
                 async with page.expect_navigation(timeout=25000):
                     await submit_btn.click()
-                    await asyncio.sleep(10)
                 await page.wait_for_load_state("load")
                 if "login" in page.url.lower():
                     browser_logger.error(
@@ -468,88 +813,93 @@ class Session:
                 account.cookies = cookies
                 await session.commit()
             
-        self.account.cookies = cookies
+        self.account = self.account.evolve(cookies=cookies)
+        await CookieValidityCache.remember(self.account.id, cookies)
         
         browser_logger.info(
             f"Cookies for account {self.account.id} has been set!"
         )
         return True
 
-    @with_context
+    @with_context(profile="feed", queued=False)
     async def _scroll_feeds(self, page: Page):
         """
             Прокручивает главную страницу.
             С шансом comment_chance оставляет комментарий, с шансом like_chance оставляет лайк.
+            В режиме FEED_MODE="scroll" остается на странице и подгружает ленту прокруткой,
+            перезагружая ее только когда лента закончилась или устарела.
         """
+        collector = ResponseCollector(page).attach() if NETWORK_DATA_PLANE else None
         try:
             browser_logger.info(
                 f"Account {self.account.id} is now starting to scroll feed..."
             )
+            loaded_at = None
+            empty_scrolls = 0
             while self.stop_work_event and not self.stop_work_event.is_set():
-                await page.goto("https://www.threads.net/", wait_until="domcontentloaded", timeout=60000)
-                await asyncio.sleep(15)
-
-                like_btns_locator = page.locator(BrowserConstants.like_btn_selector.value)
-                comment_btns_locator = page.locator(BrowserConstants.leave_comment_btn.value)
-
-                comment_btns = await comment_btns_locator.all()
-                like_btns = await like_btns_locator.all()
-
-                for like_btn, comment_btn in zip(like_btns, comment_btns):
+                is_stale = loaded_at is None or time.monotonic() - loaded_at > FEED_RELOAD_INTERVAL
+                if FEED_MODE != "scroll" or is_stale or empty_scrolls >= FEED_MAX_EMPTY_SCROLLS:
+                    await page.goto("https://www.threads.net/", wait_until="domcontentloaded", timeout=60000)
+                    if not await wait_for_selector(page, SelectorRegistry.css("like_button"), timeout=30000, state="attached"):
+                        browser_logger.warning(
+                            f"Feed of account {self.account.id} has not shown any posts after loading."
+                        )
+                    await wait_for_dom_quiet(page)
+                    loaded_at = time.monotonic()
+                    empty_scrolls = 0
+                    await self._save_storage_state()
+                else:
+                    await scroll_feed(page)
+                    await wait_for_dom_quiet(page)
+
+                rendered = await extract_feed(page)
+                # only a scroll that rendered nothing means the feed has run out
+                empty_scrolls = 0 if rendered else empty_scrolls + 1
+
+                posts = [post for post in rendered if post.seen_key not in self.seen_posts]
+                if not posts:
+                    if rendered and FEED_MODE == "scroll":
+                        # already seen posts are scrolled past at a reading pace
+                        await pace()
+                    else:
+                        await asyncio.sleep(self.account.scroll_feed_delay)
+                    continue
+
+                if collector:
+                    for post in posts:
+                        network_post = collector.posts.get(post.id)
+                        if network_post:
+                            post.text = network_post.text or post.text
+                            post.images = network_post.images or post.images
+
+                for post in posts:
                     if self.stop_work_event and not self.stop_work_event.is_set():
+                        self.seen_posts.add(post.seen_key)
+                        like_btn = post.like_button(page)
                         await like_btn.scroll_into_view_if_needed()
                         if get_chance(self.account.like_chance):
                             # leave a like
                             await like_btn.click()
-                            await asyncio.sleep(15)
-                        if get_chance(self.account.comment_chance):
+                            await pace()
+                        if post.has_reply and (post.text or post.images) and get_chance(self.account.comment_chance):
                             try:
                                 # leave a comment
-                                await comment_btn.click()
-                                await page.wait_for_selector('div[role="dialog"]', timeout=15000, state="visible")
-
-                                comment_input = page.locator(
-                                    'div[role="dialog"] div[data-lexical-editor="true"]'
-                                ).first
-
-                                if not await comment_input.count():
-                                    continue
-
-                                post_text_locator = await page.locator(
-                                    'div[role="dialog"] span[dir="auto"] > span'
-                                ).all()
-
-                                pictures = await page.locator(
-                                    'div[role="dialog"] picture img'
-                                ).all()
-
-                                image_urls = []
-                                for picture in pictures:
-                                    src = await picture.get_attribute("src")
-                                    if src:
-                                        image_urls.append(src)
-
-                                block = post_text_locator[1]
-
-                                post_text = await block.text_content()
+                                await post.reply_button(page).click()
+                                comment_input = await SelectorRegistry.resolve(page, "post_input", timeout=15000)
 
                                 comment_text = await AiManager.request_ai(
                                     promt=self.account.persona.comment_prompt,
-                                    post_text=post_text,
-                                    image_paths=image_urls
+                                    post_text=post.text,
+                                    image_paths=post.images,
+                                    priority=AiPriority.comment,
+                                    max_chars=MAX_TEXT_LENGTH
                                 )
 
-                                await comment_input.fill(comment_text[:500])
-                                
-                                final_post_button = page.locator(
-                                    'div[role="dialog"] div[aria-hidden="false"] div div div div div div[role="button"][tabindex="0"] div'
-                                )
+                                await comment_input.fill(comment_text[:MAX_TEXT_LENGTH])
                                 
-                                final_post_button = (await final_post_button.all())[8]
-
-                                await final_post_button.click()
-
-                                await asyncio.sleep(random.uniform(5, 8))
+                                final_post_button = await SelectorRegistry.resolve(page, "publish_comment")
+                                await self._click_publish(page, final_post_button, "Reply", timeout=15000)
+                                await pace()
                             except Exception:
                                 os.makedirs("screenshots", exist_ok=True)
 
@@ -577,45 +927,50 @@ class Session:
                 self.account.owner_id,
                 f"{ERROR_SIGN} Произошла непредвиденная ошибка скроллинге ленты для аккаунта {self.account.id}!"
             )
+        finally:
+            if collector:
+                collector.detach()
 
-    @with_context
-    async def _create_text_post(self, page: Page, post_text: str):
+    async def _click_publish(self, page: Page, button: Locator, label: str, timeout: float):
         """
-            Создает текстовый пост.
+            Нажимает кнопку публикации и ждет ответа сервера на публикацию, а затем закрытия диалога.
+            Ответ с ошибкой значит, что публикация отклонена; если ответ не распознан, достаточно закрытия диалога.
         """
+        response_task = asyncio.ensure_future(wait_for_response(page, is_publish_response, timeout=timeout))
+        await asyncio.sleep(0) # the listener has to be attached before the click
         try:
-            await page.goto("https://www.threads.net/", wait_until="networkidle", timeout=60000)
-            
-            new_post_button = page.locator(
-                'div[id="barcelona-page-layout"] div div div[role="region"][tabindex="0"] div div[style="--x-paddingInline: var(--barcelona-columns-item-horizontal-padding);"] div div[role="button"][tabindex="0"]',
-            ).first
+            await button.click()
+        except Exception:
+            response_task.cancel()
+            raise
 
-            if not new_post_button:
-                return False
+        response = await response_task
+        if response is None:
+            browser_logger.warning(
+                f"{label} of account {self.account.id} got no recognizable publish response, relying on the dialog state."
+            )
+        elif not response.ok:
+            raise CustomExceptions.PublishRejected(f"{label} was rejected with HTTP {response.status} ({response.url})")
 
-            await new_post_button.wait_for(state="visible", timeout=60000)
-            await new_post_button.click()
+        if not await wait_for_selector(page, 'div[role="dialog"]', timeout=timeout, state="hidden"):
+            raise CustomExceptions.DialogNotClosed(f"{label} dialog is still open after publishing")
 
-            post_input_field = page.locator(
-                'div[role="dialog"] div[data-lexical-editor="true"]'
-            ).first
+    @with_context(profile="text_post", priority=Priority.publish, timeout=600)
+    async def _create_text_post(self, page: Page, post_text: str):
+        """
+            Создает текстовый пост.
+        """
+        try:
+            await page.goto("https://www.threads.net/", wait_until="domcontentloaded", timeout=60000)
             
-            if not post_input_field:
-                return False
+            new_post_button = await SelectorRegistry.resolve(page, "new_post_button", timeout=60000)
+            await new_post_button.click()
 
+            post_input_field = await SelectorRegistry.resolve(page, "post_input")
             await post_input_field.fill(post_text)
 
-            final_post_button = page.locator(
-                'div[role="dialog"] div[aria-hidden="false"] div div div div div div[role="button"][tabindex="0"] div'
-            )
-            
-            final_post_button = (await final_post_button.all())[9]
-            
-            if not final_post_button:
-                return False
-
-            await final_post_button.click()
-            await asyncio.sleep(random.uniform(5, 8))
+            final_post_button = await SelectorRegistry.resolve(page, "publish_text_post")
+            await self._click_publish(page, final_post_button, "Post", timeout=30000)
 
             return True
         except Exception:
@@ -635,7 +990,7 @@ class Session:
             )
             return False
             
-    @with_context
+    @with_context(profile="media_post", priority=Priority.publish, timeout=900)
     async def _create_media_post(self, page: Page, media_path: str, post_text: str):
         """
             Создает текстовый пост с фото.
@@ -644,29 +999,15 @@ class Session:
             browser_logger.info(
                 f"Creating media post for account {self.account.id}..."
             )
-            await page.goto("https://www.threads.net/", wait_until="networkidle", timeout=60000)
+            await page.goto("https://www.threads.net/", wait_until="domcontentloaded", timeout=60000)
             
-            new_post_button = page.locator(
-                'div[id="barcelona-page-layout"] div div div[role="region"][tabindex="0"] div div[style="--x-paddingInline: var(--barcelona-columns-item-horizontal-padding);"] div div[role="button"][tabindex="0"]',
-            ).first
-
-            if not new_post_button:
-                return False
-
-            await new_post_button.wait_for(state="visible", timeout=15000)
+            new_post_button = await SelectorRegistry.resolve(page, "new_post_button", timeout=60000)
             await new_post_button.click()
 
-            post_input_field = page.locator(
-                'div[role="dialog"] div[data-lexical-editor="true"]'
-            ).first
-            if not post_input_field:
-                return False
-
+            post_input_field = await SelectorRegistry.resolve(page, "post_input")
             await post_input_field.fill(post_text)
             
-            add_photo_btn = page.locator(
-                BrowserConstants.add_photo_btn_selector.value
-            ).first
+            add_photo_btn = await SelectorRegistry.resolve(page, "add_photo_button")
 
             async with page.expect_file_chooser() as fc_info:
                 await add_photo_btn.click()
@@ -674,21 +1015,8 @@ class Session:
             file_chooser = await fc_info.value
             await file_chooser.set_files(media_path)
 
-            final_post_button = page.locator(
-                'div[role="dialog"] div[aria-hidden="false"] div div div div div div[role="button"][tabindex="0"] div'
-            )
-            final_post_button = (await final_post_button.all())[5]
-
-            # for idx, btn in enumerate(await final_post_button.all()):
-            #     html = await btn.evaluate("(el) => el.outerHTML")
-            #     print(f'{idx} {html}')
-            # input("Press Enter to continue...")
-            
-            if not final_post_button:
-                return False
-
-            await final_post_button.click()
-            await asyncio.sleep(15)
+            final_post_button = await SelectorRegistry.resolve(page, "publish_media_post")
+            await self._click_publish(page, final_post_button, "Media post", timeout=60000)
 
             browser_logger.info(
                 f"A media post for account {self.account.id} has been created!"
@@ -708,25 +1036,40 @@ class Session:
             )
             return False
         
-    @with_context
+    @with_context(profile="stats", priority=Priority.stats, timeout=300)
     async def _fetch_stat(self, page: Page) -> dict | None:
         """"
             Получает статистику аккаунта.
          """
+        collector = ResponseCollector(page).attach() if NETWORK_DATA_PLANE else None
         try:
-            await page.goto("https://www.threads.net/", wait_until="networkidle", timeout=60000)
+            await page.goto("https://www.threads.net/", wait_until="domcontentloaded", timeout=60000)
 
-            profile_button = page.locator(BrowserConstants.profile_btn_selector.value).first
+            profile_button = await SelectorRegistry.resolve(page, "profile_button", timeout=30000)
             await profile_button.click()
 
-            await asyncio.sleep(5)
-
-            followers_locator = page.locator('span[title]').first
+            if collector and self.account.username:
+                profile = await collector.wait_for_profile(self.account.username)
+                if profile:
+                    own_posts = [
+                        post for post in collector.posts.values()
+                        if post.username and post.username.lower() == profile.username.lower()
+                    ]
+                    return {
+                        "followers": profile.followers,
+                        "likes": sum(post.like_count for post in own_posts),
+                        "replies": sum(post.reply_count for post in own_posts),
+                    }
+
+            browser_logger.warning(
+                f"Stats of account {self.account.id} were read from the page: likes and replies are not available."
+            )
+            followers_locator = await SelectorRegistry.resolve(page, "followers", timeout=15000)
             followers_count = await followers_locator.get_attribute("title")
 
-            like_locator = page.locator('div[role="button"][tabindex="0"] div div div[style="--x-width: 1ch;"]')
-            
-            items = await like_locator.all()
+            return {
+                "followers": int(re.sub(r"\D", "", followers_count or "") or 0),
+            }
         except Exception:
             os.makedirs("screenshots", exist_ok=True)
 
@@ -739,16 +1082,22 @@ class Session:
                 f"A error was occured while fetching stats for account {self.account.id}!\n" + traceback.format_exc()
             )
             return None
+        finally:
+            if collector:
+                collector.detach()
 
 
 class ThreadsManager:
     """
         Менеджер для работы с сессиями.
     """
-    browser: Browser = None
+    browsers: list[Browser] = []
+    browser_lock = asyncio.Lock()
     playwright: Playwright = None
+    asset_cache: AssetCache = None
     sessions: dict[int, Session] = {}
-    scheduler: AsyncIOScheduler = AsyncIOScheduler(timezone=timezone("Europe/Moscow"))
+    pending_refreshes: dict[int, asyncio.TimerHandle] = {}
+    timers: TimerScheduler = TimerScheduler()
 
     @classmethod
     async def is_runned(cls, account_id: int) -> bool:
@@ -760,41 +1109,90 @@ class ThreadsManager:
     @classmethod
     async def start_browser(cls):
         """
-            Запуск браузера.
+            Запуск пула браузеров.
         """
         try:
             browser_logger.info(
-                f"Starting browser..."
+                f"Starting {BROWSER_POOL_SIZE} browser(s)..."
             )
-            if cls.browser is None:
-                playwright = await async_playwright().start()
-                cls.playwright = playwright
-                cls.browser = await playwright.chromium.launch(headless=os.getenv("HEADLESS", "True").lower() == "true")
+            async with cls.browser_lock:
+                if cls.playwright is None:
+                    cls.playwright = await async_playwright().start()
+                if cls.asset_cache is None and ASSET_CACHE_ENABLED:
+                    cls.asset_cache = AssetCache(ASSET_CACHE_DIR, ASSET_CACHE_MAX_MB * 1024 * 1024)
+                while len(cls.browsers) < BROWSER_POOL_SIZE:
+                    cls.browsers.append(await cls._launch_browser())
             browser_logger.info(
-                f"Browser has successfully started up!"
+                f"Browser pool has successfully started up!"
             )
         except Exception:
             browser_logger.error(
                 f"A error was occured while starting a browser!\n" + traceback.format_exc()
             )
 
+    @classmethod
+    async def _launch_browser(cls) -> Browser:
+        """
+            Запуск одного процесса Chromium.
+        """
+        browser = await cls.playwright.chromium.launch(headless=os.getenv("HEADLESS", "True").lower() == "true")
+        browser.on("disconnected", cls._on_browser_disconnected)
+        return browser
+
+    @classmethod
+    def _on_browser_disconnected(cls, browser: Browser):
+        """
+            Обработчик падения браузера: отвязывает его сессии и перезапускает процесс.
+        """
+        if browser not in cls.browsers:
+            return
+        cls.browsers.remove(browser)
+        browser_logger.error(
+            f"A browser has been disconnected! Restarting..."
+        )
+        for session in cls.sessions.values():
+            if session.browser is browser:
+                session._drop_context()
+        asyncio.get_running_loop().create_task(cls.start_browser())
+
+    @staticmethod
+    def _browser_load(browser: Browser) -> tuple[int, int]:
+        """
+            Нагрузка браузера: количество открытых контекстов и страниц.
+        """
+        contexts = browser.contexts
+        return len(contexts), sum(len(context.pages) for context in contexts)
+
+    @classmethod
+    async def get_browser(cls) -> Browser | None:
+        """
+            Возвращает наименее загруженный браузер из пула.
+        """
+        if len(cls.browsers) < BROWSER_POOL_SIZE:
+            await cls.start_browser()
+        if not cls.browsers:
+            return None
+        return min(cls.browsers, key=cls._browser_load)
+
     @classmethod
     async def stop_browser(cls):
         """
-            Остановка браузера.
+            Остановка пула браузеров.
         """
         try:
             browser_logger.info(
-                f"Stopping the browser..."
+                f"Stopping the browsers..."
             )
-            if cls.browser:
-                await cls.browser.close()
+            for session in cls.sessions.values():
+                await session.close()
+            browsers, cls.browsers = cls.browsers, []
+            for browser in browsers:
+                await browser.close()
             if cls.playwright:
                 await cls.playwright.stop()
-            cls.browser = None
             cls.playwright = None
             browser_logger.info(
-                f"Browser has been stopped."
+                f"Browsers have been stopped."
             )
         except Exception:
             browser_logger.error(
@@ -811,6 +1209,24 @@ class ThreadsManager:
             None
         )
 
+    @classmethod
+    async def load_snapshot(cls, account_id: int, version: int = 1) -> AccountSnapshot | None:
+        """
+            Загружает аккаунт со всеми связями и собирает его снимок.
+        """
+        async with async_session() as db_session:
+            account = await db_session.scalar(
+                select(Account)
+                .where(Account.id == account_id)
+                .options(
+                    selectinload(Account.persona),
+                    selectinload(Account.schedules),
+                    selectinload(Account.medias),
+                )
+            )
+            if account:
+                return AccountSnapshot.from_orm(account, version=version)
+
     @classmethod
     async def create_session(cls, account: Account, configure_scheduler: bool = True):
         """
@@ -827,8 +1243,12 @@ class ThreadsManager:
                 )
                 return session
 
+            snapshot = await cls.load_snapshot(account.id)
+            if not snapshot:
+                return None
+
             session = Session(
-                account=account
+                account=snapshot
             )
             cls.sessions[account.id] = session
             
@@ -845,6 +1265,7 @@ class ThreadsManager:
                     browser_logger.error(
                         f"Login credentials are invalid for account {account.id}!"
                     )
+                    await session.close()
                     del cls.sessions[account.id]
                     return None    
             
@@ -870,7 +1291,9 @@ class ThreadsManager:
                 f"Closing {account_id} session..."
             )
             if cls.sessions.get(account_id, None):
+                cls.timers.cancel_account(account_id)
                 await cls.sessions[account_id].stop_working()
+                await cls.sessions[account_id].close()
                 del cls.sessions[account_id]
                 
             browser_logger.info(
@@ -881,6 +1304,14 @@ class ThreadsManager:
                 f"A error was occured while closing a session for account {account_id}!\n" + traceback.format_exc()
             )
 
+    @classmethod
+    async def forget_account(cls, account_id: int):
+        """
+            Закрывает сессию удаляемого аккаунта и удаляет его снимок storage_state с диска.
+        """
+        await cls.close_session(account_id)
+        StorageSnapshots.remove(account_id)
+
     @classmethod
     async def refresh_account_data(cls, account_id: int):
         """
@@ -895,29 +1326,49 @@ class ThreadsManager:
             if not session:
                 return
 
-            async with async_session() as db_session:
-                account = await db_session.scalar(
-                    select(Account)
-                    .where(Account.id == account_id)
-                    .options(
-                        selectinload(Account.persona),
-                        selectinload(Account.owner),
-                        selectinload(Account.schedules),
-                        selectinload(Account.medias),
-                    )
+            snapshot = await cls.load_snapshot(account_id, version=session.account.version + 1)
+            if not snapshot:
+                return
+
+            changes = snapshot.diff(session.account)
+            if not changes:
+                browser_logger.info(
+                    f"Data for account {account_id} has not changed."
                 )
+                return
 
-                if account:
-                    session.account = copy.deepcopy(account)
-            await session._configure_scheduler()
+            session.account = snapshot
+            if "schedules" in changes:
+                await session._configure_scheduler()
+            if "medias" in changes or any(change.startswith("persona.") for change in changes):
+                await session._prune_drafts()
             browser_logger.info(
-                f"Refreshed data for account {account_id}."
+                f"Refreshed data for account {account_id}. Changed: {', '.join(sorted(changes)) or 'nothing'}."
             )
         except Exception:
             browser_logger.error(
                 f"A error was occured while refreshing data for account {account_id}!\n" + traceback.format_exc()
             )
 
+    @classmethod
+    def request_refresh(cls, account_id: int):
+        """
+            Отложенное обновление данных сессии: все запросы для аккаунта в течение REFRESH_DEBOUNCE секунд
+            объединяются в одно обновление.
+        """
+        if account_id not in cls.sessions:
+            return
+        loop = asyncio.get_running_loop()
+        handle = cls.pending_refreshes.pop(account_id, None)
+        if handle:
+            handle.cancel()
+
+        def run():
+            cls.pending_refreshes.pop(account_id, None)
+            loop.create_task(cls.refresh_account_data(account_id))
+
+        cls.pending_refreshes[account_id] = loop.call_later(REFRESH_DEBOUNCE, run)
+
     @classmethod
     async def start_scheduler(cls):
         """
@@ -927,13 +1378,12 @@ class ThreadsManager:
             scheduler_logger.info(
                 f"Starting ThreadsManager scheduler..."
             )
-            cls.scheduler.add_job(
+            cls.timers.cancel_kind(None, "fetch_stats")
+            cls.timers.add(
+                None, "fetch_stats", datetime.now(SCHEDULER_TIMEZONE),
                 cls.fetch_stats,
-                'interval',
-                hours=os.getenv("STATS_FETCH_INTERVAL_HOURS", 4),
-                next_run_time=datetime.now()
+                interval=timedelta(hours=float(os.getenv("STATS_FETCH_INTERVAL_HOURS", 4)))
             )
-            cls.scheduler.start()
             scheduler_logger.info(
                 f"ThreadsManager scheduler has been started!"
             )
@@ -953,22 +1403,13 @@ class ThreadsManager:
                     select(Account)
                 )
 
-                for account in accounts:
-                    refreshed_account = await session.scalars(
-                        select(Account)
-                        .where(Account.id == account.id)
-                        .options(
-                            selectinload(Account.persona),
-                            selectinload(Account.owner),
-                            selectinload(Account.schedules),
-                            selectinload(Account.medias),
-                        )
-                    )
-                    session = await cls.create_session(
-                        refreshed_account,
+                for account in accounts.all():
+                    threads_session = await cls.create_session(
+                        account,
                         configure_scheduler=False
                     )
-                    stats = await session._fetch_stat()
+                    if threads_session:
+                        stats = await threads_session._fetch_stat()
         except Exception:
             browser_logger.error(
                 f"A error was occured while fetching stats for all accounts!\n" + traceback.format_exc()
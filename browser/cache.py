@@ -0,0 +1,168 @@
+from playwright.async_api import Route
+from playwright._impl import _errors
+from collections import OrderedDict
+from urllib.parse import urlsplit
+import traceback
+import hashlib
+import asyncio
+import json
+import os
+
+from config.logger import browser_logger
+
+
+ASSET_CACHE_ENABLED = os.getenv("ASSET_CACHE_ENABLED", "True").lower() == "true"
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", os.path.join("cache", "assets"))
+ASSET_CACHE_MAX_MB = int(os.getenv("ASSET_CACHE_MAX_MB", 512))
+
+STATIC_RESOURCE_TYPES = ("script", "stylesheet", "font")
+STATIC_HOST_SUFFIXES = ("cdninstagram.com", "fbcdn.net")
+STORED_HEADERS = (
+    "content-type",
+    "cache-control",
+    "access-control-allow-origin",
+    "cross-origin-resource-policy",
+    "timing-allow-origin",
+)
+
+
+class AssetCache:
+    """
+        Общий для всех контекстов дисковый кэш неизменяемых статических ресурсов (JS/CSS/шрифты)
+        с ограничением размера и вытеснением давно не использованных файлов.
+    """
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._index: OrderedDict[str, int] = OrderedDict()
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".body"):
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name[:-len(".body")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self.total_bytes += size
+
+    def _paths(self, key: str) -> tuple[str, str]:
+        base = os.path.join(self.directory, key)
+        return base + ".body", base + ".json"
+
+    @staticmethod
+    def is_cacheable(url: str, resource_type: str, method: str) -> bool:
+        """
+            Кэшируются только GET-запросы статических ресурсов с CDN, пути которых содержат хэш контента.
+        """
+        if method != "GET" or resource_type not in STATIC_RESOURCE_TYPES:
+            return False
+        parts = urlsplit(url)
+        return parts.hostname is not None and parts.hostname.endswith(STATIC_HOST_SUFFIXES) and "/rsrc.php/" in parts.path
+
+    @staticmethod
+    def key_for(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _read(self, key: str) -> tuple[bytes, dict]:
+        body_path, meta_path = self._paths(key)
+        with open(meta_path, "r", encoding="utf-8") as f:
+            headers = json.load(f)
+        with open(body_path, "rb") as f:
+            body = f.read()
+        os.utime(body_path)
+        return body, headers
+
+    def _write(self, key: str, body: bytes, headers: dict):
+        body_path, meta_path = self._paths(key)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(headers, f)
+        with open(body_path, "wb") as f:
+            f.write(body)
+
+    def _remove(self, key: str):
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    async def get(self, key: str) -> tuple[bytes, dict] | None:
+        if key not in self._index:
+            return None
+        try:
+            result = await asyncio.to_thread(self._read, key)
+        except OSError:
+            self.total_bytes -= self._index.pop(key, 0)
+            return None
+        self._index.move_to_end(key)
+        return result
+
+    async def put(self, key: str, body: bytes, headers: dict):
+        if len(body) > self.max_bytes:
+            return
+        await asyncio.to_thread(self._write, key, body, headers)
+        self.total_bytes += len(body) - self._index.get(key, 0)
+        self._index[key] = len(body)
+        self._index.move_to_end(key)
+
+        evicted = []
+        while self.total_bytes > self.max_bytes and self._index:
+            old_key, size = self._index.popitem(last=False)
+            self.total_bytes -= size
+            evicted.append(old_key)
+        for old_key in evicted:
+            await asyncio.to_thread(self._remove, old_key)
+
+    async def handle_route(self, route: Route):
+        """
+            Обработчик context.route: отдает статические ресурсы из кэша, остальное пропускает дальше.
+        """
+        request = route.request
+        if not self.is_cacheable(request.url, request.resource_type, request.method):
+            await route.fallback()
+            return
+
+        key = self.key_for(request.url)
+        try:
+            cached = await self.get(key)
+            if cached is None and key in self._in_flight:
+                cached = await asyncio.shield(self._in_flight[key])
+            if cached is not None:
+                body, headers = cached
+                await route.fulfill(status=200, headers=headers, body=body)
+                return
+
+            future = asyncio.get_running_loop().create_future()
+            self._in_flight[key] = future
+            try:
+                response = await route.fetch()
+                body = await response.body()
+                cached = None
+                if response.status == 200:
+                    headers = {
+                        name: value for name, value in response.headers.items()
+                        if name.lower() in STORED_HEADERS
+                    }
+                    await self.put(key, body, headers)
+                    cached = (body, headers)
+                future.set_result(cached)
+            finally:
+                if not future.done():
+                    future.set_result(None)
+                self._in_flight.pop(key, None)
+            await route.fulfill(response=response, body=body)
+        except _errors.Error:
+            browser_logger.error(
+                f"A error was occured while serving cached asset {request.url}!\n" + traceback.format_exc()
+            )
+            try:
+                await route.abort()
+            except _errors.Error:
+                pass
@@ -0,0 +1,76 @@
+from sqlalchemy import select
+from datetime import datetime, timedelta
+import hashlib
+import json
+import time
+import os
+
+from database.models import async_session, CookieCheck
+
+
+COOKIE_CHECK_TTL = int(os.getenv("COOKIE_CHECK_TTL", 6 * 60 * 60))
+AUTH_COOKIE_NAME = "sessionid"
+
+
+class CookieValidityCache:
+    """
+        Кэш проверок cookie: срок жизни сессионной cookie и время последней успешной проверки.
+        Результаты хранятся в таблице cookie_checks, поэтому переживают перезапуск.
+    """
+    _checks: dict[int, tuple[str, datetime]] = {}
+
+    @staticmethod
+    def cookies_hash(cookies: list[dict]) -> str:
+        pairs = sorted((cookie.get("name", ""), cookie.get("value", "")) for cookie in cookies)
+        return hashlib.sha256(json.dumps(pairs).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def has_live_session_cookie(cookies: list[dict]) -> bool:
+        """
+            Проверяет, что среди cookie есть неистекшая сессионная cookie.
+        """
+        for cookie in cookies:
+            if cookie.get("name") == AUTH_COOKIE_NAME and cookie.get("value"):
+                expires = cookie.get("expires", -1)
+                return expires is None or expires <= 0 or expires > time.time()
+        return False
+
+    @classmethod
+    async def is_fresh(cls, account_id: int, cookies: list[dict]) -> bool:
+        """
+            True, если эти же cookie успешно проверялись не раньше COOKIE_CHECK_TTL секунд назад.
+        """
+        check = cls._checks.get(account_id)
+        if check is None:
+            async with async_session() as session:
+                row = await session.scalar(
+                    select(CookieCheck).where(CookieCheck.account_id == account_id)
+                )
+                if not row:
+                    return False
+                check = cls._checks[account_id] = (row.cookies_hash, row.checked_at)
+
+        cookies_hash, checked_at = check
+        return (
+            cookies_hash == cls.cookies_hash(cookies)
+            and datetime.now() - checked_at < timedelta(seconds=COOKIE_CHECK_TTL)
+        )
+
+    @classmethod
+    async def remember(cls, account_id: int, cookies: list[dict]):
+        """
+            Запоминает успешную проверку cookie.
+        """
+        check = (cls.cookies_hash(cookies), datetime.now())
+        cls._checks[account_id] = check
+        async with async_session() as session:
+            row = await session.get(CookieCheck, account_id)
+            if row is None:
+                row = CookieCheck(account_id=account_id)
+                session.add(row)
+            row.cookies_hash, row.checked_at = check
+            await session.commit()
+
+    @classmethod
+    def forget(cls, account_id: int):
+        cls._checks.pop(account_id, None)
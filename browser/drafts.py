@@ -0,0 +1,97 @@
+from sqlalchemy import select, delete, func
+import hashlib
+import os
+
+from database.enums import DatabaseEnums
+from database.models import async_session, Draft
+
+
+DRAFTS_PER_ACCOUNT = int(os.getenv("DRAFTS_PER_ACCOUNT", 3))
+DRAFT_REFILL_INTERVAL = int(os.getenv("DRAFT_REFILL_INTERVAL", 600))
+
+Kind = DatabaseEnums.DraftKind
+
+
+class DraftBuffer:
+    """
+        Буфер заранее сгенерированных текстов аккаунтов в таблице drafts.
+        Черновик привязан к хэшу промта, из которого он получен: после изменения персоны старые черновики не выдаются.
+    """
+    @staticmethod
+    def prompt_hash(prompt: str) -> str:
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+    @classmethod
+    async def count(cls, account_id: int, kind: DatabaseEnums.DraftKind, prompt_hash: str, media_id: int = None) -> int:
+        async with async_session() as session:
+            return await session.scalar(
+                select(func.count(Draft.id))
+                .where(Draft.account_id == account_id)
+                .where(Draft.kind == kind)
+                .where(Draft.prompt_hash == prompt_hash)
+                .where(Draft.media_id == media_id)
+            )
+
+    @classmethod
+    async def add(cls, account_id: int, kind: DatabaseEnums.DraftKind, prompt_hash: str, text: str, media_id: int = None,
+                  limit: int = None) -> bool:
+        """
+            Кладет черновик в буфер. С limit черновик не добавляется, если подходящих уже limit или больше.
+        """
+        if limit is not None and await cls.count(account_id, kind, prompt_hash, media_id) >= limit:
+            return False
+        async with async_session() as session:
+            session.add(Draft(
+                account_id=account_id,
+                media_id=media_id,
+                kind=kind,
+                text=text,
+                prompt_hash=prompt_hash,
+            ))
+            await session.commit()
+        return True
+
+    @classmethod
+    async def take(cls, account_id: int, kind: DatabaseEnums.DraftKind, prompt_hash: str, media_id: int = None) -> str | None:
+        """
+            Забирает самый старый подходящий черновик, удаляя его из буфера.
+        """
+        async with async_session() as session:
+            draft = await session.scalar(
+                select(Draft)
+                .where(Draft.account_id == account_id)
+                .where(Draft.kind == kind)
+                .where(Draft.prompt_hash == prompt_hash)
+                .where(Draft.media_id == media_id)
+                .order_by(Draft.created_at, Draft.id)
+                .limit(1)
+            )
+            if draft is None:
+                return None
+            text = draft.text
+            await session.delete(draft)
+            await session.commit()
+        return text
+
+    @classmethod
+    async def prune(cls, account_id: int, prompt_hashes: dict[DatabaseEnums.DraftKind, str | None], media_ids: list[int]):
+        """
+            Удаляет черновики, сгенерированные по устаревшим промтам, и подписи к уже удаленным медиа.
+        """
+        async with async_session() as session:
+            for kind, prompt_hash in prompt_hashes.items():
+                statement = (
+                    delete(Draft)
+                    .where(Draft.account_id == account_id)
+                    .where(Draft.kind == kind)
+                )
+                if prompt_hash:
+                    statement = statement.where(Draft.prompt_hash != prompt_hash)
+                await session.execute(statement)
+            await session.execute(
+                delete(Draft)
+                .where(Draft.account_id == account_id)
+                .where(Draft.media_id.is_not(None))
+                .where(Draft.media_id.not_in(media_ids))
+            )
+            await session.commit()
@@ -4,4 +4,10 @@ class CustomExceptions:
     class NoCookiesProvided(Exception):
         pass
     class CookieInvalid(Exception):
+        pass
+    class SelectorNotFound(Exception):
+        pass
+    class DialogNotClosed(Exception):
+        pass
+    class PublishRejected(Exception):
         pass
\ No newline at end of file
@@ -0,0 +1,115 @@
+from playwright.async_api import Page, Locator
+from dataclasses import dataclass, field
+import hashlib
+
+from .registry import SelectorRegistry
+
+
+FEED_EXTRACTOR_JS = """
+({likeSelector, replySelector}) => {
+    window.__taiSeq = window.__taiSeq || 0;
+
+    const posts = [];
+    for (const likePath of document.querySelectorAll(likeSelector)) {
+        const likeButton = likePath.closest('[role="button"]');
+        if (!likeButton || likeButton.hasAttribute('data-tai-like')) {
+            continue;
+        }
+
+        let container = likeButton.parentElement;
+        while (container && !(container.querySelector(replySelector) && container.querySelector('a[href*="/post/"]'))) {
+            container = container.parentElement;
+        }
+        if (!container) {
+            continue;
+        }
+
+        const replyPath = container.querySelector(replySelector);
+        const replyButton = replyPath ? replyPath.closest('[role="button"]') : null;
+        const link = container.querySelector('a[href*="/post/"]');
+        const href = link.getAttribute('href');
+        const match = href.match(/\\/post\\/([^/?#]+)/);
+
+        let text = '';
+        for (const span of container.querySelectorAll('span[dir="auto"] > span')) {
+            const content = span.textContent || '';
+            if (content.length > text.length) {
+                text = content;
+            }
+        }
+
+        const images = [];
+        for (const img of container.querySelectorAll('picture img')) {
+            const src = img.getAttribute('src');
+            if (src && !images.includes(src)) {
+                images.push(src);
+            }
+        }
+
+        const key = String(++window.__taiSeq);
+        likeButton.setAttribute('data-tai-like', key);
+        if (replyButton) {
+            replyButton.setAttribute('data-tai-reply', key);
+        }
+
+        posts.push({
+            key: key,
+            id: match ? match[1] : null,
+            url: href,
+            text: text,
+            images: images,
+            has_reply: Boolean(replyButton),
+        });
+    }
+    return posts;
+}
+"""
+
+
+@dataclass
+class FeedPost:
+    """Пост ленты, извлеченный одним вызовом page.evaluate."""
+    key: str
+    id: str | None
+    url: str | None
+    text: str
+    images: list[str] = field(default_factory=list)
+    has_reply: bool = False
+
+    @property
+    def seen_key(self) -> str:
+        """Ключ для множества просмотренных постов: код поста, иначе его ссылка, иначе хэш текста и изображений."""
+        if self.id:
+            return self.id
+        if self.url:
+            return self.url
+        raw = "\n".join([self.text, *self.images])
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+
+    def like_button(self, page: Page) -> Locator:
+        return page.locator(f'[data-tai-like="{self.key}"]')
+
+    def reply_button(self, page: Page) -> Locator:
+        return page.locator(f'[data-tai-reply="{self.key}"]')
+
+
+async def scroll_feed(page: Page):
+    """
+        Прокручивает ленту вниз, чтобы приложение подгрузило следующие посты.
+    """
+    await page.evaluate("window.scrollBy(0, document.documentElement.clientHeight * 2)")
+
+
+async def extract_feed(page: Page) -> list[FeedPost]:
+    """
+        Извлекает посты ленты за один CDP-запрос.
+        Кнопки лайка и ответа помечаются data-атрибутами, чтобы потом действовать на них по ключу поста.
+    """
+    raw_posts = await page.evaluate(
+        FEED_EXTRACTOR_JS,
+        {
+            "likeSelector": SelectorRegistry.css("like_button"),
+            "replySelector": SelectorRegistry.css("reply_button"),
+        }
+    )
+    return [FeedPost(**raw_post) for raw_post in raw_posts]
@@ -0,0 +1,181 @@
+from playwright.async_api import Page, Response
+from playwright._impl import _errors
+from dataclasses import dataclass, field
+from collections import OrderedDict
+import traceback
+import asyncio
+import json
+import sys
+import os
+
+from config.logger import browser_logger
+
+
+NETWORK_DATA_PLANE = os.getenv("NETWORK_DATA_PLANE", "False").lower() == "true"
+NETWORK_MAX_ITEMS = int(os.getenv("NETWORK_MAX_ITEMS", 500))
+
+JSON_URL_MARKERS = ("/graphql", "/api/")
+JSON_PREFIXES = ("for (;;);",)
+
+
+@dataclass
+class NetworkPost:
+    """Пост, разобранный из JSON-ответа приложения."""
+    code: str
+    text: str = ""
+    images: list[str] = field(default_factory=list)
+    username: str | None = None
+    like_count: int = 0
+    reply_count: int = 0
+
+
+@dataclass
+class NetworkProfile:
+    """Профиль, разобранный из JSON-ответа приложения."""
+    username: str
+    followers: int = 0
+
+
+def _best_image(item: dict) -> str | None:
+    candidates = (item.get("image_versions2") or {}).get("candidates") or []
+    if not candidates:
+        return None
+    return max(candidates, key=lambda c: (c.get("width") or 0) * (c.get("height") or 0)).get("url")
+
+
+def _parse_post(item: dict) -> NetworkPost:
+    caption = item.get("caption") or {}
+    images = []
+    for media in item.get("carousel_media") or [item]:
+        url = _best_image(media)
+        if url:
+            images.append(url)
+    app_info = item.get("text_post_app_info") or {}
+    return NetworkPost(
+        code=item["code"],
+        text=caption.get("text") or "",
+        images=images,
+        username=(item.get("user") or {}).get("username"),
+        like_count=item.get("like_count") or 0,
+        reply_count=app_info.get("direct_reply_count") or 0,
+    )
+
+
+def parse_payload(payload) -> tuple[list[NetworkPost], list[NetworkProfile]]:
+    """
+        Рекурсивно обходит JSON-ответ и собирает из него посты и профили.
+        Не зависит от браузера, поэтому проверяется на записанных ответах.
+    """
+    posts, profiles = [], []
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if isinstance(node.get("code"), str) and "caption" in node:
+                posts.append(_parse_post(node))
+            if isinstance(node.get("username"), str) and isinstance(node.get("follower_count"), int):
+                profiles.append(NetworkProfile(username=node["username"], followers=node["follower_count"]))
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return posts, profiles
+
+
+def load_payload(body: str):
+    """
+        Разбирает тело ответа, снимая защитные префиксы вроде "for (;;);".
+    """
+    body = body.lstrip()
+    for prefix in JSON_PREFIXES:
+        if body.startswith(prefix):
+            body = body[len(prefix):]
+    return json.loads(body)
+
+
+class ResponseCollector:
+    """
+        Слушает JSON/GraphQL-ответы страницы и накапливает посты и профили из них.
+        Хранятся только NETWORK_MAX_ITEMS последних постов и профилей, чтобы долгая прокрутка ленты не копила память.
+    """
+    def __init__(self, page: Page):
+        self.page = page
+        self.posts: OrderedDict[str, NetworkPost] = OrderedDict()
+        self.profiles: OrderedDict[str, NetworkProfile] = OrderedDict()
+        self._updated = asyncio.Event()
+        self._tasks: set[asyncio.Task] = set()
+
+    def attach(self) -> 'ResponseCollector':
+        self.page.on("response", self._on_response)
+        return self
+
+    def detach(self):
+        self.page.remove_listener("response", self._on_response)
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+
+    def _on_response(self, response: Response):
+        if response.request.resource_type not in ("xhr", "fetch"):
+            return
+        content_type = response.headers.get("content-type", "")
+        if "json" not in content_type and not any(marker in response.url for marker in JSON_URL_MARKERS):
+            return
+        task = asyncio.get_running_loop().create_task(self._consume(response))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _consume(self, response: Response):
+        try:
+            payload = load_payload(await response.text())
+        except (_errors.Error, ValueError):
+            return
+        try:
+            posts, profiles = parse_payload(payload)
+        except Exception:
+            browser_logger.error(
+                f"A error was occured while parsing response {response.url}!\n" + traceback.format_exc()
+            )
+            return
+        for post in posts:
+            self._remember(self.posts, post.code, post)
+        for profile in profiles:
+            self._remember(self.profiles, profile.username.lower(), profile)
+        if posts or profiles:
+            self._updated.set()
+
+    @staticmethod
+    def _remember(items: OrderedDict, key: str, value):
+        items[key] = value
+        items.move_to_end(key)
+        while len(items) > NETWORK_MAX_ITEMS:
+            items.popitem(last=False)
+
+    async def wait_for_profile(self, username: str, timeout: float = 15000) -> NetworkProfile | None:
+        """
+            Ждет, пока в ответах появится профиль username, не дольше timeout мс.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout / 1000
+        while (profile := self.profiles.get(username.lower())) is None:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            self._updated.clear()
+            try:
+                await asyncio.wait_for(self._updated.wait(), remaining)
+            except asyncio.TimeoutError:
+                return None
+        return profile
+
+
+if __name__ == "__main__":
+    # python -m browser.network response.json — разбор записанного ответа для проверки парсера
+    for path in sys.argv[1:]:
+        with open(path, encoding="utf-8") as file:
+            posts, profiles = parse_payload(load_payload(file.read()))
+        print(f"{path}: {len(posts)} posts, {len(profiles)} profiles")
+        for post in posts:
+            print(f"  post {post.code} @{post.username}: {post.like_count} likes, {post.reply_count} replies, "
+                  f"{len(post.images)} images, {post.text[:60]!r}")
+        for profile in profiles:
+            print(f"  profile @{profile.username}: {profile.followers} followers")
@@ -0,0 +1,95 @@
+from enum import IntEnum
+from typing import Awaitable, Callable
+import itertools
+import asyncio
+
+
+class Priority(IntEnum):
+    """Приоритет браузерной операции: меньше — важнее."""
+    auth = 0
+    publish = 1
+    comment = 2
+    stats = 3
+
+
+class OperationQueue:
+    """
+        Очередь браузерных операций одной сессии с приоритетами.
+        Операции выполняют не более concurrency воркеров, поэтому число одновременно открытых
+        страниц аккаунта ограничено, а гонки за контекст исключены.
+    """
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.running = 0
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._counter = itertools.count()
+        self._workers: list[asyncio.Task] = []
+
+    @property
+    def depth(self) -> int:
+        """Количество операций, ожидающих выполнения."""
+        return self._queue.qsize()
+
+    def _ensure_workers(self):
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        while len(self._workers) < self.concurrency:
+            self._workers.append(asyncio.create_task(self._work()))
+
+    async def submit(self, operation: Callable[[], Awaitable], priority: Priority, timeout: float = None):
+        """
+            Ставит операцию в очередь и ждет ее результата.
+            timeout отсчитывается с момента постановки в очередь; отмена ожидающего отменяет и саму операцию.
+        """
+        self._ensure_workers()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        deadline = loop.time() + timeout if timeout else None
+        await self._queue.put((priority, next(self._counter), operation, future, deadline))
+        return await future
+
+    async def _work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, operation, future, deadline = await self._queue.get()
+            try:
+                if future.done():
+                    continue
+                remaining = deadline - loop.time() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    future.set_exception(asyncio.TimeoutError("Operation deadline has passed while queued"))
+                    continue
+
+                task = asyncio.ensure_future(operation())
+                future.add_done_callback(lambda f, task=task: task.cancel() if f.cancelled() else None)
+                self.running += 1
+                try:
+                    result = await asyncio.wait_for(task, remaining)
+                except asyncio.CancelledError:
+                    if not future.done():
+                        future.cancel()
+                    if asyncio.current_task().cancelling():
+                        raise
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+                finally:
+                    self.running -= 1
+            finally:
+                self._queue.task_done()
+
+    async def close(self):
+        """
+            Останавливает воркеры и отменяет все ожидающие операции.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        while not self._queue.empty():
+            _, _, _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+            self._queue.task_done()
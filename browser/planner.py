@@ -0,0 +1,180 @@
+from sqlalchemy import select, update, delete
+from datetime import date, datetime, timedelta
+import hashlib
+import os
+
+from config.logger import scheduler_logger
+from database.enums import DatabaseEnums
+from database.models import async_session, PlannedAction
+from database.snapshots import AccountSnapshot, ScheduleSnapshot
+from .timers import SCHEDULER_TIMEZONE, scheduler_now
+from utils import generate_publish_times
+
+
+PLAN_HORIZON_DAYS = int(os.getenv("PLAN_HORIZON_DAYS", 3))
+LOAD_HORIZON_HOURS = int(os.getenv("LOAD_HORIZON_HOURS", 36))
+
+Kind = DatabaseEnums.PlannedActionKind
+Status = DatabaseEnums.PlannedActionStatus
+
+
+class ActionPlanner:
+    """
+        Планирование действий аккаунтов в таблице planned_actions.
+        План строится пачкой на PLAN_HORIZON_DAYS дней вперед; при изменении расписания
+        переписываются только строки окон, настройки которых поменялись.
+    """
+    @staticmethod
+    def fingerprint(schedule: ScheduleSnapshot) -> str:
+        raw = f"{int(schedule.day_of_week)}|{schedule.start_time}|{schedule.end_time}|{schedule.post_count}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def _plan_window(cls, account_id: int, schedule: ScheduleSnapshot, day: date, now: datetime) -> list[PlannedAction]:
+        start_dt = datetime.combine(day, schedule.start_time)
+        end_dt = datetime.combine(day, schedule.end_time)
+        if end_dt <= now:
+            return []
+
+        fingerprint = cls.fingerprint(schedule)
+
+        def action(kind, due_at):
+            return PlannedAction(
+                account_id=account_id,
+                schedule_id=schedule.id,
+                kind=kind,
+                due_at=due_at,
+                status=Status.planned,
+                window_date=day,
+                schedule_fingerprint=fingerprint,
+            )
+
+        # a window that is already in progress starts right away
+        actions = [
+            action(Kind.start, max(start_dt, now)),
+            action(Kind.stop, end_dt),
+        ]
+        publish_times = generate_publish_times(
+            start_dt=start_dt,
+            end_dt=end_dt,
+            post_count=schedule.post_count,
+            jitter_spread=0.2,
+            min_margin=timedelta(seconds=5)
+        )
+        actions.extend(action(Kind.publish, pt) for pt in publish_times if pt > now)
+        return actions
+
+    @classmethod
+    async def sync_account(cls, account: AccountSnapshot):
+        """
+            Приводит план аккаунта в соответствие с его расписаниями:
+            удаляет невыполненные строки удаленных или измененных расписаний и достраивает недостающие окна.
+        """
+        now = scheduler_now()
+        today = now.date()
+        schedules = {schedule.id: schedule for schedule in account.schedules}
+
+        async with async_session() as session:
+            rows = (await session.scalars(
+                select(PlannedAction)
+                .where(PlannedAction.account_id == account.id)
+                .where(PlannedAction.window_date >= today)
+            )).all()
+
+            stale_ids = []
+            planned_windows = set()
+            for row in rows:
+                schedule = schedules.get(row.schedule_id)
+                is_current = schedule is not None and row.schedule_fingerprint == cls.fingerprint(schedule)
+                if is_current:
+                    planned_windows.add((row.schedule_id, row.window_date))
+                elif row.status == Status.planned:
+                    stale_ids.append(row.id)
+
+            if stale_ids:
+                await session.execute(
+                    delete(PlannedAction).where(PlannedAction.id.in_(stale_ids))
+                )
+
+            new_actions = []
+            for offset in range(PLAN_HORIZON_DAYS):
+                day = today + timedelta(days=offset)
+                for schedule in schedules.values():
+                    if schedule.day_of_week != day.weekday() or (schedule.id, day) in planned_windows:
+                        continue
+                    if not schedule.start_time or not schedule.end_time:
+                        continue
+                    new_actions.extend(cls._plan_window(account.id, schedule, day, now))
+
+            session.add_all(new_actions)
+            await session.commit()
+
+        if stale_ids or new_actions:
+            scheduler_logger.info(
+                f"Account {account.id} plan updated: {len(stale_ids)} actions removed, {len(new_actions)} actions added."
+            )
+
+    @classmethod
+    async def load_due(cls, account_id: int) -> list[tuple[int, DatabaseEnums.PlannedActionKind, datetime]]:
+        """
+            Загружает запланированные действия аккаунта на ближайшие LOAD_HORIZON_HOURS часов как (id, kind, due_at),
+            due_at — время с часовым поясом SCHEDULER_TIMEZONE. Просроченные действия помечаются пропущенными, кроме старта окна, которое еще не закончилось.
+        """
+        now = scheduler_now()
+        async with async_session() as session:
+            rows = (await session.scalars(
+                select(PlannedAction)
+                .where(PlannedAction.account_id == account_id)
+                .where(PlannedAction.status == Status.planned)
+                .where(PlannedAction.due_at < now + timedelta(hours=LOAD_HORIZON_HOURS))
+                .order_by(PlannedAction.due_at)
+            )).all()
+
+            running_windows = {
+                (row.schedule_id, row.window_date) for row in rows
+                if row.kind == Kind.stop and row.due_at > now
+            }
+            missed_ids, due = [], []
+            for row in rows:
+                if row.due_at <= now and not (row.kind == Kind.start and (row.schedule_id, row.window_date) in running_windows):
+                    missed_ids.append(row.id)
+                else:
+                    due.append((row.id, row.kind, SCHEDULER_TIMEZONE.localize(row.due_at)))
+            if missed_ids:
+                await session.execute(
+                    update(PlannedAction)
+                    .where(PlannedAction.id.in_(missed_ids))
+                    .values(status=Status.missed)
+                )
+                await session.commit()
+        return due
+
+    @classmethod
+    async def has_open_window(cls, account_id: int) -> bool:
+        """
+            Идет ли сейчас окно работы аккаунта: его старт уже наступил, а стоп еще впереди.
+            Нужен, чтобы продолжить работу после перезапуска процесса посреди окна.
+        """
+        now = scheduler_now()
+        async with async_session() as session:
+            rows = (await session.execute(
+                select(PlannedAction.kind, PlannedAction.schedule_id, PlannedAction.window_date)
+                .where(PlannedAction.account_id == account_id)
+                .where(
+                    ((PlannedAction.kind == Kind.start) & (PlannedAction.due_at <= now))
+                    | ((PlannedAction.kind == Kind.stop) & (PlannedAction.status == Status.planned) & (PlannedAction.due_at > now))
+                )
+            )).all()
+
+        started = {(row.schedule_id, row.window_date) for row in rows if row.kind == Kind.start}
+        return any(row.kind == Kind.stop and (row.schedule_id, row.window_date) in started for row in rows)
+
+    @classmethod
+    async def set_status(cls, action_id: int, status: DatabaseEnums.PlannedActionStatus):
+        async with async_session() as session:
+            await session.execute(
+                update(PlannedAction)
+                .where(PlannedAction.id == action_id)
+                .values(status=status)
+            )
+            await session.commit()
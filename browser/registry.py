@@ -0,0 +1,187 @@
+from playwright.async_api import Page, Locator
+from dataclasses import dataclass
+from weakref import WeakKeyDictionary
+import asyncio
+import time
+import os
+
+from config.logger import browser_logger
+from .enums import BrowserConstants
+from .exceptions import CustomExceptions
+
+
+SELECTOR_TIMEOUT = int(os.getenv("SELECTOR_TIMEOUT", 10000))
+SELECTOR_POLL_INTERVAL = 0.25
+
+DIALOG_BUTTONS = 'div[role="dialog"] div[aria-hidden="false"] div div div div div div[role="button"][tabindex="0"] div'
+
+
+@dataclass(frozen=True)
+class Strategy:
+    """Один способ найти элемент: CSS-селектор и, при необходимости, позиция среди совпадений."""
+    css: str
+    nth: int | None = None
+
+    def locator(self, page: Page) -> Locator:
+        locator = page.locator(self.css)
+        if self.nth is None:
+            return locator.first
+        return locator.nth(self.nth)
+
+    def __str__(self):
+        return self.css if self.nth is None else f"{self.css} [{self.nth}]"
+
+
+@dataclass
+class StrategyStats:
+    hits: int = 0
+    misses: int = 0
+    total_latency: float = 0.0
+
+    @property
+    def avg_latency(self) -> float:
+        return self.total_latency / self.hits if self.hits else 0.0
+
+
+class SelectorRegistry:
+    """
+        Реестр UI-элементов Threads. Для каждого элемента хранится упорядоченный список стратегий поиска:
+        первой идет проверенная в работе, дальше — запасные. Результат кэшируется до следующей навигации страницы,
+        а каждое разрешение пишется в статистику.
+    """
+    targets: dict[str, list[Strategy]] = {
+        "new_post_button": [
+            Strategy('div[id="barcelona-page-layout"] div div div[role="region"][tabindex="0"] div div[style="--x-paddingInline: var(--barcelona-columns-item-horizontal-padding);"] div div[role="button"][tabindex="0"]'),
+            Strategy(BrowserConstants.new_post_btn_selector.value),
+        ],
+        "dialog": [
+            Strategy('div[role="dialog"]'),
+        ],
+        "post_input": [
+            Strategy('div[role="dialog"] div[data-lexical-editor="true"]'),
+            Strategy('div[role="dialog"] div[contenteditable="true"]'),
+        ],
+        "publish_text_post": [
+            Strategy(DIALOG_BUTTONS, nth=9),
+            Strategy(BrowserConstants.final_post_btn_selector.value),
+        ],
+        "publish_media_post": [
+            Strategy(DIALOG_BUTTONS, nth=5),
+            Strategy(BrowserConstants.final_post_btn_selector.value),
+        ],
+        "publish_comment": [
+            Strategy(DIALOG_BUTTONS, nth=8),
+            Strategy(BrowserConstants.final_post_btn_selector.value),
+        ],
+        "add_photo_button": [
+            Strategy(BrowserConstants.add_photo_btn_selector.value),
+        ],
+        "like_button": [
+            Strategy(BrowserConstants.like_btn_selector.value),
+        ],
+        "reply_button": [
+            Strategy(BrowserConstants.leave_comment_btn.value),
+        ],
+        "profile_button": [
+            Strategy(BrowserConstants.profile_btn_selector.value),
+        ],
+        "followers": [
+            Strategy('span[title]'),
+        ],
+    }
+    stats: dict[tuple[str, int], StrategyStats] = {}
+    _cache: WeakKeyDictionary = WeakKeyDictionary()
+
+    @classmethod
+    def css(cls, target: str) -> str:
+        """
+            Селектор первой стратегии элемента (для скриптов page.evaluate).
+        """
+        return cls.targets[target][0].css
+
+    @classmethod
+    async def resolve(cls, page: Page, target: str, timeout: float = None) -> Locator:
+        """
+            Находит элемент по стратегиям реестра.
+            Все стратегии опрашиваются по кругу до общего дедлайна, поэтому сломанный основной селектор
+            не съедает весь таймаут, если сработал запасной. Если не сработала ни одна — CustomExceptions.SelectorNotFound.
+        """
+        page_cache = cls._page_cache(page)
+        started_at = time.monotonic()
+
+        strategy_index = page_cache.get(target)
+        if strategy_index is not None:
+            locator = cls.targets[target][strategy_index].locator(page)
+            if await locator.count():
+                cls._record_hit(target, strategy_index, time.monotonic() - started_at, cached=True)
+                return locator
+            del page_cache[target]
+
+        strategies = cls.targets[target]
+        timeout = SELECTOR_TIMEOUT if timeout is None else timeout
+        deadline = started_at + timeout / 1000
+
+        while True:
+            for index, strategy in enumerate(strategies):
+                locator = strategy.locator(page)
+                if await locator.count():
+                    cls._record_hit(target, index, time.monotonic() - started_at)
+                    page_cache[target] = index
+                    return locator
+            if time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(SELECTOR_POLL_INTERVAL)
+
+        for index in range(len(strategies)):
+            cls.stats.setdefault((target, index), StrategyStats()).misses += 1
+        browser_logger.error(
+            f"Selector '{target}' regressed: no strategy matched within {timeout} ms on {page.url}! "
+            f"Stats: {cls._describe(target)}"
+        )
+        raise CustomExceptions.SelectorNotFound(target)
+
+    @classmethod
+    def _record_hit(cls, target: str, index: int, latency: float, cached: bool = False):
+        """
+            Учитывает попадание стратегии. При попадании из кэша предыдущие стратегии не опрашивались,
+            поэтому промахи им не засчитываются и предупреждение о запасной стратегии не повторяется.
+        """
+        cls.stats.setdefault((target, index), StrategyStats())
+        cls.stats[(target, index)].hits += 1
+        cls.stats[(target, index)].total_latency += latency
+        if cached:
+            return
+
+        for missed_index in range(index):
+            cls.stats.setdefault((target, missed_index), StrategyStats()).misses += 1
+        if index:
+            browser_logger.warning(
+                f"Selector '{target}' resolved by fallback strategy #{index} ({cls.targets[target][index]}), "
+                f"primary strategy ({cls.targets[target][0]}) did not match! Stats: {cls._describe(target)}"
+            )
+
+    @classmethod
+    def _page_cache(cls, page: Page) -> dict[str, int]:
+        """
+            Кэш стратегий страницы; сбрасывается при каждой навигации основного фрейма.
+        """
+        page_cache = cls._cache.get(page)
+        if page_cache is None:
+            page_cache = cls._cache[page] = {}
+
+            def on_navigated(frame):
+                if frame == page.main_frame:
+                    page_cache.clear()
+            page.on("framenavigated", on_navigated)
+        return page_cache
+
+    @classmethod
+    def _describe(cls, target: str) -> str:
+        """
+            Попадания, промахи и средняя задержка стратегий элемента для логов.
+        """
+        parts = []
+        for index in range(len(cls.targets[target])):
+            stats = cls.stats.get((target, index), StrategyStats())
+            parts.append(f"#{index} {stats.hits} hits / {stats.misses} misses / {stats.avg_latency:.3f}s")
+        return "; ".join(parts)
@@ -0,0 +1,56 @@
+from playwright.async_api import Page, Route
+from weakref import WeakKeyDictionary
+import os
+
+
+RESOURCE_BLOCKING = os.getenv("RESOURCE_BLOCKING", "True").lower() == "true"
+
+TRACKING_MARKERS = (
+    "/ajax/bz",
+    "/ajax/bnzai",
+    "/logging_client_events",
+    "/falco_",
+)
+
+
+class BlockingProfiles:
+    """
+        Профили блокировки ресурсов для page.route, выбираемые на время операции.
+        Профиль описывает типы ресурсов (request.resource_type), которые нужно прервать.
+        Картинки ленты не скачиваются браузером: их URL остаются в DOM, а для комментария
+        изображения по этим URL загружает AiManager.
+    """
+    profiles: dict[str, frozenset[str]] = {
+        "full": frozenset(),
+        "auth": frozenset({"image", "media", "font"}),
+        "stats": frozenset({"image", "media", "font"}),
+        "feed": frozenset({"image", "media", "font"}),
+        "text_post": frozenset({"image", "media", "font"}),
+        "media_post": frozenset({"media", "font"}),
+    }
+    _active: WeakKeyDictionary = WeakKeyDictionary()
+
+    @classmethod
+    async def apply(cls, page: Page, profile: str):
+        """
+            Включает профиль для страницы. Обработчик маршрута ставится один раз на страницу пула,
+            дальше меняется только активный профиль.
+        """
+        if not RESOURCE_BLOCKING:
+            return
+        if page not in cls._active:
+            async def handler(route: Route):
+                await cls._handle(page, route)
+            await page.route("**/*", handler)
+        cls._active[page] = cls.profiles[profile]
+
+    @classmethod
+    async def _handle(cls, page: Page, route: Route):
+        request = route.request
+        blocked = cls._active.get(page, frozenset())
+        if request.resource_type in blocked:
+            await route.abort("blockedbyclient")
+        elif blocked and any(marker in request.url for marker in TRACKING_MARKERS):
+            await route.abort("blockedbyclient")
+        else:
+            await route.fallback()
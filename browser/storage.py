@@ -0,0 +1,49 @@
+import asyncio
+import gzip
+import json
+import os
+
+
+STORAGE_STATE_DIR = os.getenv("STORAGE_STATE_DIR", "states")
+STORAGE_STATE_MIN_INTERVAL = int(os.getenv("STORAGE_STATE_MIN_INTERVAL", 60))
+
+
+class StorageSnapshots:
+    """
+        Снимки storage_state() контекстов (cookie, localStorage, IndexedDB) на диске в сжатом виде.
+    """
+    @staticmethod
+    def _path(account_id: int) -> str:
+        return os.path.join(STORAGE_STATE_DIR, f"{account_id}.json.gz")
+
+    @classmethod
+    def _read(cls, account_id: int) -> dict | None:
+        try:
+            with gzip.open(cls._path(account_id), "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def _write(cls, account_id: int, state: dict):
+        os.makedirs(STORAGE_STATE_DIR, exist_ok=True)
+        path = cls._path(account_id)
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(state, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    async def load(cls, account_id: int) -> dict | None:
+        return await asyncio.to_thread(cls._read, account_id)
+
+    @classmethod
+    async def save(cls, account_id: int, state: dict):
+        await asyncio.to_thread(cls._write, account_id, state)
+
+    @classmethod
+    def remove(cls, account_id: int):
+        try:
+            os.remove(cls._path(account_id))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,196 @@
+from datetime import datetime, timedelta
+from typing import Any, Callable, Hashable
+from pytz import timezone
+import traceback
+import itertools
+import asyncio
+import heapq
+import os
+
+from config.logger import scheduler_logger
+
+
+SCHEDULER_TIMEZONE = timezone(os.getenv("SCHEDULER_TIMEZONE", "Europe/Moscow"))
+
+
+def scheduler_now() -> datetime:
+    """
+        Текущее время в SCHEDULER_TIMEZONE без tzinfo — в нем хранятся due_at и задаются окна расписаний.
+        Часовой пояс хоста на него не влияет.
+    """
+    return datetime.now(SCHEDULER_TIMEZONE).replace(tzinfo=None)
+
+
+class TimerJob:
+    """Задача глобального планировщика."""
+    __slots__ = ("account_id", "kind", "run_at", "callback", "args", "interval", "cancelled")
+
+    def __init__(self, account_id: Hashable, kind: str, run_at: float, callback: Callable, args: tuple, interval: timedelta | None):
+        self.account_id = account_id
+        self.kind = kind
+        self.run_at = run_at
+        self.callback = callback
+        self.args = args
+        self.interval = interval
+        self.cancelled = False
+
+    @property
+    def key(self) -> tuple[Hashable, str]:
+        return self.account_id, self.kind
+
+    @property
+    def run_at_datetime(self) -> datetime:
+        return datetime.fromtimestamp(self.run_at, SCHEDULER_TIMEZONE)
+
+
+class TimerScheduler:
+    """
+        Один планировщик на весь парк аккаунтов: куча задач по времени запуска и один таймер на ближайшую.
+        Задачи индексируются по (account_id, kind); отмена ленивая — помеченная задача выбрасывается из кучи при извлечении,
+        а когда отмененных в куче становится больше живых, куча пересобирается.
+    """
+    def __init__(self):
+        self._heap: list[tuple[float, int, TimerJob]] = []
+        self._cancelled = 0
+        self._tasks: set[asyncio.Task] = set()
+        self._counter = itertools.count()
+        self._jobs: dict[tuple[Hashable, str], set[TimerJob]] = {}
+        self._accounts: dict[Hashable, set[str]] = {}
+        self._wakeup: asyncio.Event = None
+        self._runner: asyncio.Task = None
+
+    @staticmethod
+    def _timestamp(run_at: datetime) -> float:
+        if run_at.tzinfo is None:
+            run_at = SCHEDULER_TIMEZONE.localize(run_at)
+        return run_at.timestamp()
+
+    def __len__(self) -> int:
+        return sum(len(jobs) for jobs in self._jobs.values())
+
+    def add(self, account_id: Hashable, kind: str, run_at: datetime, callback: Callable[..., Any], *args, interval: timedelta = None) -> TimerJob:
+        """
+            Планирует callback(*args) на run_at (наивное время считается в SCHEDULER_TIMEZONE, см. scheduler_now).
+            С interval задача перепланируется после каждого запуска; пропущенные интервалы не наверстываются.
+        """
+        job = TimerJob(account_id, kind, self._timestamp(run_at), callback, args, interval)
+        self._push(job)
+        return job
+
+    def _push(self, job: TimerJob):
+        heapq.heappush(self._heap, (job.run_at, next(self._counter), job))
+        self._jobs.setdefault(job.key, set()).add(job)
+        self._accounts.setdefault(job.account_id, set()).add(job.kind)
+        self._ensure_runner()
+        if self._heap[0][2] is job:
+            self._wakeup.set()
+
+    def _forget(self, job: TimerJob):
+        jobs = self._jobs.get(job.key)
+        if jobs is None:
+            return
+        jobs.discard(job)
+        if not jobs:
+            del self._jobs[job.key]
+            kinds = self._accounts.get(job.account_id)
+            if kinds is not None:
+                kinds.discard(job.kind)
+                if not kinds:
+                    del self._accounts[job.account_id]
+
+    def cancel(self, job: TimerJob):
+        if job.cancelled:
+            return
+        job.cancelled = True
+        if job in self._jobs.get(job.key, ()):
+            self._cancelled += 1
+        self._forget(job)
+        if self._cancelled * 2 > len(self._heap):
+            self._compact()
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+        heapq.heapify(self._heap)
+        self._cancelled = 0
+
+    def cancel_kind(self, account_id: Hashable, kind: str):
+        for job in list(self._jobs.get((account_id, kind), ())):
+            self.cancel(job)
+
+    def cancel_account(self, account_id: Hashable):
+        """
+            Отменяет все задачи аккаунта.
+        """
+        for kind in list(self._accounts.get(account_id, ())):
+            self.cancel_kind(account_id, kind)
+
+    def jobs(self, account_id: Hashable, kind: str = None) -> list[TimerJob]:
+        if kind is not None:
+            return sorted(self._jobs.get((account_id, kind), ()), key=lambda job: job.run_at)
+        result = []
+        for job_kind in self._accounts.get(account_id, ()):
+            result.extend(self._jobs[(account_id, job_kind)])
+        return sorted(result, key=lambda job: job.run_at)
+
+    def next_jobs(self, limit: int = 10) -> list[TimerJob]:
+        """
+            Ближайшие задачи по всему парку аккаунтов.
+        """
+        return [job for _, _, job in heapq.nsmallest(limit, (entry for entry in self._heap if not entry[2].cancelled))]
+
+    def _ensure_runner(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            while self._heap and self._heap[0][2].cancelled:
+                heapq.heappop(self._heap)
+                self._cancelled -= 1
+
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] - datetime.now().timestamp()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, job = heapq.heappop(self._heap)
+            self._forget(job)
+            if job.interval:
+                # a job that is behind schedule runs once, missed intervals are skipped
+                interval = job.interval.total_seconds()
+                job.run_at += interval
+                now = datetime.now().timestamp()
+                if job.run_at <= now:
+                    job.run_at += ((now - job.run_at) // interval + 1) * interval
+                self._push(job)
+            # the loop keeps only weak references to tasks
+            task = loop.create_task(self._execute(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, job: TimerJob):
+        try:
+            result = job.callback(*job.args)
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception:
+            scheduler_logger.error(
+                f"A error was occured while running {job.kind} job for account {job.account_id}!\n" + traceback.format_exc()
+            )
+
+    async def stop(self):
+        if self._runner:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
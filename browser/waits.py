@@ -0,0 +1,86 @@
+from playwright.async_api import Page, Response
+from playwright._impl import _errors
+from typing import Callable
+import asyncio
+import random
+import os
+
+
+ACTION_PACING_MIN = float(os.getenv("ACTION_PACING_MIN", 5))
+ACTION_PACING_MAX = float(os.getenv("ACTION_PACING_MAX", 15))
+
+PUBLISH_URL_MARKERS = ("/media/configure",)
+
+DOM_QUIET_JS = """
+({quietMs, timeoutMs}) => new Promise((resolve) => {
+    let quietTimer = null;
+    const observer = new MutationObserver(() => {
+        clearTimeout(quietTimer);
+        quietTimer = setTimeout(done, quietMs);
+    });
+    const deadline = setTimeout(() => done(false), timeoutMs);
+    function done(quiet = true) {
+        observer.disconnect();
+        clearTimeout(quietTimer);
+        clearTimeout(deadline);
+        resolve(quiet);
+    }
+    observer.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+    quietTimer = setTimeout(done, quietMs);
+})
+"""
+
+
+async def wait_for_selector(page: Page, selector: str, timeout: float = 15000, state: str = "visible") -> bool:
+    """
+        Ждет появления (или другого состояния) элемента не дольше timeout мс.
+        Возвращает False вместо исключения, если элемент так и не дождались.
+    """
+    try:
+        await page.wait_for_selector(selector, timeout=timeout, state=state)
+        return True
+    except _errors.TimeoutError:
+        return False
+
+
+async def wait_for_response(page: Page, predicate: Callable[[Response], bool], timeout: float = 15000) -> Response | None:
+    """
+        Ждет сетевой ответ, удовлетворяющий predicate, не дольше timeout мс.
+    """
+    try:
+        return await page.wait_for_event("response", predicate=predicate, timeout=timeout)
+    except _errors.TimeoutError:
+        return None
+
+
+def is_publish_response(response: Response) -> bool:
+    """
+        Ответ на публикацию поста или ответа: configure-запрос или GraphQL-мутация.
+    """
+    request = response.request
+    if request.method != "POST":
+        return False
+    if any(marker in response.url for marker in PUBLISH_URL_MARKERS):
+        return True
+    return "/graphql" in response.url and "Mutation" in request.headers.get("x-fb-friendly-name", "")
+
+
+async def wait_for_dom_quiet(page: Page, quiet_ms: int = 500, timeout: float = 10000) -> bool:
+    """
+        Ждет, пока DOM перестанет меняться в течение quiet_ms мс, но не дольше timeout мс.
+        Возвращает True, если страница успокоилась до дедлайна.
+    """
+    return await page.evaluate(
+        DOM_QUIET_JS,
+        {"quietMs": quiet_ms, "timeoutMs": timeout}
+    )
+
+
+async def pace(low: float = None, high: float = None):
+    """
+        Намеренная пауза между действиями аккаунта.
+        Не используется для ожидания страницы — для этого есть функции выше.
+    """
+    low = ACTION_PACING_MIN if low is None else low
+    high = ACTION_PACING_MAX if high is None else high
+    await asyncio.sleep(random.uniform(low, max(low, high)))
@@ -36,3 +36,4 @@ def setup_logger(name: str, subfolder: str, level=logging.INFO) -> logging.Logge
 bot_logger = setup_logger("bot", "bot_logs")
 scheduler_logger = setup_logger("scheduler", "scheduler_logs")
 browser_logger = setup_logger("browser", "browser_logs")
+ai_logger = setup_logger("ai", "ai_logs")
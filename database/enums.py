@@ -60,3 +60,21 @@ class DatabaseEnums:
                 DatabaseEnums.EngagementCategories.politics,
                 DatabaseEnums.EngagementCategories.religion
             )
+
+
+    class PlannedActionKind(PyEnum):
+        start = 'start'
+        stop = 'stop'
+        publish = 'publish'
+
+
+    class PlannedActionStatus(PyEnum):
+        planned = 'planned'
+        done = 'done'
+        missed = 'missed'
+        failed = 'failed'
+
+
+    class DraftKind(PyEnum):
+        text = 'text'
+        caption = 'caption'
@@ -1,4 +1,4 @@
-from sqlalchemy import event, DateTime, Time, Column, Integer, ForeignKey, String, JSON, Text, Enum, Float
+from sqlalchemy import event, Date, DateTime, Time, Column, Integer, ForeignKey, String, JSON, Text, Enum, Float, Index
 from sqlalchemy.orm import DeclarativeBase, relationship
 from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine
 from datetime import datetime, timezone
@@ -47,6 +47,8 @@ class Account(Base):
     schedules = relationship("Schedule", back_populates="account", cascade="all, delete-orphan")
     medias = relationship("Media", back_populates="account", cascade="all, delete-orphan")
     stats = relationship("Stat", backref="account", cascade="all, delete-orphan")
+    planned_actions = relationship("PlannedAction", back_populates="account", cascade="all, delete-orphan")
+    drafts = relationship("Draft", back_populates="account", cascade="all, delete-orphan")
     
     __field_labels__ = {
         "proxy": "Прокси",
@@ -172,6 +174,63 @@ class Stat(Base):
     likes = Column(Integer, nullable=False, default=0)
     replies = Column(Integer, nullable=False, default=0)
 
+class PlannedAction(Base):
+    __tablename__ = "planned_actions"
+    id = Column(Integer, primary_key=True)
+    account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
+    schedule_id = Column(Integer, ForeignKey("schedules.id", ondelete="SET NULL"), nullable=True)
+
+    kind = Column(Enum(DatabaseEnums.PlannedActionKind), nullable=False)
+    due_at = Column(DateTime, nullable=False)
+    status = Column(Enum(DatabaseEnums.PlannedActionStatus), nullable=False, default=DatabaseEnums.PlannedActionStatus.planned)
+
+    # window the action belongs to and the schedule settings it was generated from
+    window_date = Column(Date, nullable=False)
+    schedule_fingerprint = Column(String(64), nullable=True)
+
+    account = relationship("Account", back_populates="planned_actions")
+
+    __table_args__ = (
+        Index("ix_planned_actions_due_at_status", "due_at", "status"),
+        Index("ix_planned_actions_account_window", "account_id", "window_date"),
+    )
+
+class Draft(Base):
+    __tablename__ = "drafts"
+    id = Column(Integer, primary_key=True)
+    account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
+    media_id = Column(Integer, ForeignKey("media.id", ondelete="CASCADE"), nullable=True) # media the caption is written for
+
+    kind = Column(Enum(DatabaseEnums.DraftKind), nullable=False)
+    text = Column(Text, nullable=False)
+    prompt_hash = Column(String(64), nullable=False) # hash of the parsed prompt the text was generated from
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+
+    account = relationship("Account", back_populates="drafts")
+
+    __table_args__ = (
+        Index("ix_drafts_account_kind", "account_id", "kind"),
+    )
+
+class CookieCheck(Base):
+    __tablename__ = "cookie_checks"
+    account_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True)
+    cookies_hash = Column(String(64), nullable=False)
+    checked_at = Column(DateTime, nullable=False)
+
+class ImageDescription(Base):
+    __tablename__ = "image_descriptions"
+    content_hash = Column(String(64), primary_key=True) # sha256 of the original image bytes
+    description = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+
+class ImageCaption(Base):
+    __tablename__ = "image_captions"
+    content_hash = Column(String(64), primary_key=True) # sha256 of the original image bytes
+    prompt_hash = Column(String(64), primary_key=True) # sha256 of the parsed photo prompt
+    caption = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.now)
+
 @event.listens_for(Media, 'before_delete')
 def before_delete_media(mapper, connection, target):
     try:
@@ -204,37 +263,25 @@ def before_insert_media(mapper, connection, target):
 def after_insert_account(mapper, connection, target):
     from browser.base import ThreadsManager
 
-    loop = asyncio.get_running_loop()
-    loop.create_task(ThreadsManager.refresh_account_data(
-        target.id
-    ))
+    ThreadsManager.request_refresh(target.id)
 
 @event.listens_for(Account, 'after_update')
 def after_update_account(mapper, connection, target):
     from browser.base import ThreadsManager
 
-    loop = asyncio.get_running_loop()
-    loop.create_task(ThreadsManager.refresh_account_data(
-        target.id
-    ))
+    ThreadsManager.request_refresh(target.id)
 
 @event.listens_for(Persona, 'after_insert')
 def after_insert_persona(mapper, connection, target):
     from browser.base import ThreadsManager
 
-    loop = asyncio.get_running_loop()
-    loop.create_task(ThreadsManager.refresh_account_data(
-        target.account_id
-    ))
+    ThreadsManager.request_refresh(target.account_id)
 
 @event.listens_for(Persona, 'after_update')
 def after_update_persona(mapper, connection, target):
     from browser.base import ThreadsManager
 
-    loop = asyncio.get_running_loop()
-    loop.create_task(ThreadsManager.refresh_account_data(
-        target.account_id
-    ))
+    ThreadsManager.request_refresh(target.account_id)
     
 async def create_columns():
     async with engine.begin() as conn:
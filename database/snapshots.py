@@ -0,0 +1,149 @@
+from dataclasses import dataclass, field, fields, replace
+from datetime import time
+from typing import Any
+
+from .enums import DatabaseEnums
+from .models import Account, Persona, Schedule, Media
+
+
+@dataclass(frozen=True, slots=True)
+class PersonaSnapshot:
+    id: int
+    name: str | None
+    age: int | None
+    gender: DatabaseEnums.Sex | None
+    country: str | None
+    city: str | None
+    role: str | None
+    style: DatabaseEnums.CommunicationStyle | None
+    values: tuple
+    interests: tuple
+    triggers: str | None
+    examples: tuple
+    text_prompt: str | None
+    photo_prompt: str | None
+    comment_prompt: str | None
+    engagement_level: DatabaseEnums.EngagementLevel | None
+    engagement_categorioes: tuple
+
+    @classmethod
+    def from_orm(cls, persona: Persona) -> 'PersonaSnapshot':
+        return cls(
+            id=persona.id,
+            name=persona.name,
+            age=persona.age,
+            gender=persona.gender,
+            country=persona.country,
+            city=persona.city,
+            role=persona.role,
+            style=persona.style,
+            values=tuple(persona.values or ()),
+            interests=tuple(persona.interests or ()),
+            triggers=persona.triggers,
+            examples=tuple(persona.examples or ()),
+            text_prompt=persona.text_prompt,
+            photo_prompt=persona.photo_prompt,
+            comment_prompt=persona.comment_prompt,
+            engagement_level=persona.engagement_level,
+            engagement_categorioes=tuple(persona.engagement_categorioes or ()),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class ScheduleSnapshot:
+    id: int
+    day_of_week: DatabaseEnums.DayOfWeek
+    start_time: time | None
+    end_time: time | None
+    post_count: int
+
+    @classmethod
+    def from_orm(cls, schedule: Schedule) -> 'ScheduleSnapshot':
+        return cls(
+            id=schedule.id,
+            day_of_week=schedule.day_of_week,
+            start_time=schedule.start_time,
+            end_time=schedule.end_time,
+            post_count=schedule.post_count,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class MediaSnapshot:
+    id: int
+    filepath: str
+    tags: Any
+
+    @classmethod
+    def from_orm(cls, media: Media) -> 'MediaSnapshot':
+        return cls(
+            id=media.id,
+            filepath=media.filepath,
+            tags=media.tags,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class AccountSnapshot:
+    """
+        Неизменяемый снимок аккаунта для сессии браузера.
+        Собирается один раз при обновлении данных; version растет при каждом изменении содержимого.
+    """
+    id: int
+    owner_id: int
+    proxy: str | None
+    username: str | None
+    password: str | None
+    cookies: list[dict] | None
+    like_chance: float
+    comment_chance: float
+    scroll_feed_delay: int
+    persona: PersonaSnapshot | None
+    schedules: tuple[ScheduleSnapshot, ...]
+    medias: tuple[MediaSnapshot, ...]
+    version: int = field(default=1, compare=False)
+
+    @classmethod
+    def from_orm(cls, account: Account, version: int = 1) -> 'AccountSnapshot':
+        """
+            Собирает снимок из Account, у которого загружены persona, schedules и medias.
+        """
+        return cls(
+            id=account.id,
+            owner_id=account.owner_id,
+            proxy=account.proxy,
+            username=account.username,
+            password=account.password,
+            cookies=account.cookies,
+            like_chance=account.like_chance,
+            comment_chance=account.comment_chance,
+            scroll_feed_delay=account.scroll_feed_delay,
+            persona=PersonaSnapshot.from_orm(account.persona) if account.persona else None,
+            schedules=tuple(ScheduleSnapshot.from_orm(schedule) for schedule in account.schedules),
+            medias=tuple(MediaSnapshot.from_orm(media) for media in account.medias),
+            version=version,
+        )
+
+    def evolve(self, **changes) -> 'AccountSnapshot':
+        """
+            Новый снимок с измененными полями и следующей версией.
+        """
+        return replace(self, version=self.version + 1, **changes)
+
+    def diff(self, other: 'AccountSnapshot') -> set[str]:
+        """
+            Имена полей, отличающихся от other; для персоны — "persona.<поле>".
+        """
+        changes = set()
+        for snapshot_field in fields(self):
+            name = snapshot_field.name
+            if not snapshot_field.compare or getattr(self, name) == getattr(other, name):
+                continue
+            if name == "persona" and self.persona is not None and other.persona is not None:
+                changes.update(
+                    f"persona.{persona_field.name}" for persona_field in fields(PersonaSnapshot)
+                    if getattr(self.persona, persona_field.name) != getattr(other.persona, persona_field.name)
+                )
+            else:
+                changes.add(name)
+        return changes
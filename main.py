@@ -6,6 +6,7 @@ load_dotenv()
 from bot.app import start_tg_bot
 from database.models import create_columns
 from browser.base import ThreadsManager
+from ai.base import AiManager
 
 
 async def main():
@@ -13,7 +14,10 @@ async def main():
     await ThreadsManager.start_browser()
     # await ThreadsManager.start_scheduler()
 
-    await start_tg_bot()
+    try:
+        await start_tg_bot()
+    finally:
+        await AiManager.close()
 
 
 if __name__ == "__main__":
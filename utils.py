@@ -1,3 +1,4 @@
+from collections import OrderedDict
 from datetime import timedelta, datetime
 import random
 
@@ -46,3 +47,24 @@ def generate_publish_times(start_dt: datetime, end_dt: datetime, post_count: int
 
     result.sort()
     return result
+
+
+class LRUSet:
+    """
+        Множество ограниченного размера: при переполнении вытесняются давно не встречавшиеся элементы.
+    """
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items: OrderedDict = OrderedDict()
+
+    def __contains__(self, item) -> bool:
+        return item in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, item):
+        self._items[item] = None
+        self._items.move_to_end(item)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)